@@ -5,6 +5,10 @@ class LessonInline(admin.TabularInline):
     model = Lesson
     extra = 1
 
+    def get_queryset(self, request):
+        # The form edits quiz, so load it with the rows
+        return super().get_queryset(request).with_quiz()
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at')
@@ -49,6 +53,7 @@ class AnswerInline(admin.TabularInline):
 @admin.register(TestSubmission)
 class TestSubmissionAdmin(admin.ModelAdmin):
     list_display = ('user', 'test', 'score', 'start_time', 'end_time', 'is_completed')
+    list_select_related = ('user', 'test__lesson')
     list_filter = ('test', 'is_completed')
     readonly_fields = ('user', 'test', 'score', 'start_time', 'end_time', 'is_completed')
     inlines = [AnswerInline]
@@ -56,6 +61,7 @@ class TestSubmissionAdmin(admin.ModelAdmin):
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ('submission', 'question', 'is_correct')
+    list_select_related = ('submission__user', 'submission__test', 'question')
     list_filter = ('is_correct', 'question__question_type')
     readonly_fields = ('submission', 'question', 'selected_choices', 'text_answer')
     fields = ('submission', 'question', 'selected_choices', 'text_answer', 'is_correct', 'feedback')
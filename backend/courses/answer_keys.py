@@ -0,0 +1,105 @@
+"""Precompiled answer keys used to grade test submissions.
+
+An answer key holds everything grading needs to know about a test's
+questions, so a submission can be graded without touching the questions
+and choices tables. Keys are kept in a small in-process LRU backed by the
+``content`` cache and are invalidated by bumping a per-test version there
+once a change to a test, question or choice commits (see
+``courses.signals``). Processes only see each other's bumps through a
+shared cache, so deployments running several processes must point
+``CONTENT_CACHE_URL`` at one.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .content_cache import CACHE_ALIAS, current_version
+from .models import Question
+from .scoring import extract_key_terms, idf_weights, tokenize
+
+# idf_weights and idf_default come from the whole test (see scoring.idf_weights);
+# without them every word weighs the same
+QuestionKey = namedtuple('QuestionKey', [
+    'question_type', 'points', 'choice_ids', 'correct_choice_ids', 'key_terms', 'answer_tokens',
+    'idf_weights', 'idf_default',
+], defaults=((), 1.0))
+
+# Bumped whenever QuestionKey changes shape, so stale pickles are never read
+KEY_FORMAT = 3
+
+LRU_SIZE = 128
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(test_id):
+    return f'courses:answer-key-version:{test_id}'
+
+
+def build_answer_key(test_id):
+    """Compile the answer key of a test from the database."""
+    questions = Question.objects.filter(test_id=test_id).prefetch_related('choices')
+    weights, default = idf_weights([
+        tokenize(' '.join(filter(None, [question.text, question.correct_answer, question.explanation])))
+        for question in questions
+    ])
+    return {
+        question.id: QuestionKey(
+            question_type=question.question_type,
+            points=question.points,
+            choice_ids=frozenset(choice.id for choice in question.choices.all()),
+            correct_choice_ids=frozenset(choice.id for choice in question.choices.all() if choice.is_correct),
+            key_terms=extract_key_terms(question.correct_answer),
+            answer_tokens=tuple(tokenize(question.correct_answer)),
+            idf_weights=weights,
+            idf_default=default,
+        )
+        for question in questions
+    }
+
+
+def get_answer_key(test_id):
+    """Return the answer key of a test as a dict of question id to QuestionKey."""
+    version = current_version(_version_key(test_id))
+    with _lru_lock:
+        entry = _lru.get(test_id)
+        if entry is not None and entry[0] == version:
+            _lru.move_to_end(test_id)
+            return entry[1]
+
+    cache = _cache()
+    cache_key = f'courses:answer-key:{KEY_FORMAT}:{test_id}:{version}'
+    key = cache.get(cache_key)
+    if key is None:
+        key = build_answer_key(test_id)
+        cache.set(cache_key, key, CACHE_TIMEOUT)
+
+    with _lru_lock:
+        _lru[test_id] = (version, key)
+        _lru.move_to_end(test_id)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+    return key
+
+
+def invalidate_answer_key(test_id):
+    """Make every process sharing the cache rebuild a test's answer key.
+
+    The version is bumped when the current transaction commits; a bump
+    before that would let a submission graded meanwhile cache the key of
+    the old rows under the new version.
+    """
+    def bump():
+        _cache().set(_version_key(test_id), time.time_ns(), None)
+        with _lru_lock:
+            _lru.pop(test_id, None)
+    transaction.on_commit(bump)
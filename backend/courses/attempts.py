@@ -0,0 +1,125 @@
+"""Attempt limits, cooldowns and the closing of abandoned submissions.
+
+A test may cap the attempts each user starts (``max_attempts``) and make
+them wait between attempts (``attempt_cooldown``). Both are checked and
+counted by a single conditional UPDATE of the user's ``AttemptCounter``
+row, so concurrent starts can't slip past the limit and starting an attempt
+never counts submissions.
+
+Answers are accepted until a submission's deadline, its start plus the
+test's time limit, with a short grace period for answers in transit.
+Submissions that are never submitted stay open until ``reap_abandoned``
+closes the expired ones, graded on the answers they have, after which they
+count towards the statistics and progress like any other.
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .grading import chunks, rebuild_scores
+from .models import AttemptCounter, Test, TestSubmission
+from .progress import rebuild_progress, record_progress
+from .stats import rebuild_test_stats, record_completion
+
+# Answers posted just as the time runs out are still on their way
+GRACE_PERIOD = timedelta(minutes=1)
+
+
+class AttemptNotAllowed(Exception):
+    def __init__(self, detail, retry_after=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def count_attempt(test, user):
+    """Count a new attempt of ``user`` at ``test``, or raise AttemptNotAllowed."""
+    limited = test.max_attempts is not None or test.attempt_cooldown > 0
+    if user is None:
+        if limited:
+            raise AttemptNotAllowed("Log in to take this test, its attempts are limited.")
+        return
+
+    now = timezone.now()
+    cooldown = timedelta(minutes=test.attempt_cooldown)
+    allowed = Q()
+    if test.max_attempts is not None:
+        allowed &= Q(started__lt=test.max_attempts)
+    if cooldown:
+        allowed &= Q(last_started_at__isnull=True) | Q(last_started_at__lte=now - cooldown)
+    counters = AttemptCounter.objects.filter(user=user, test=test)
+    updates = {'started': F('started') + 1, 'last_started_at': now}
+    if counters.filter(allowed).update(**updates):
+        return
+    # First attempt: create the row, then take the same conditional path
+    AttemptCounter.objects.bulk_create([AttemptCounter(user=user, test=test)], ignore_conflicts=True)
+    if counters.filter(allowed).update(**updates):
+        return
+
+    counter = counters.get()
+    if test.max_attempts is not None and counter.started >= test.max_attempts:
+        raise AttemptNotAllowed(f"All {test.max_attempts} attempts at this test have been used.")
+    wait = counter.last_started_at + cooldown - now
+    raise AttemptNotAllowed(
+        "The next attempt at this test can start later.", retry_after=max(math.ceil(wait.total_seconds()), 1),
+    )
+
+
+def deadline(submission):
+    """When the time to answer a submission runs out, or None without a time limit."""
+    if not submission.test.time_limit:
+        return None
+    return submission.start_time + timedelta(minutes=submission.test.time_limit)
+
+
+def expired(submission, now=None):
+    """Whether it is too late to submit answers for the submission."""
+    end = deadline(submission)
+    return end is not None and (now or timezone.now()) > end + GRACE_PERIOD
+
+
+def close_expired(submission):
+    """Close a locked, expired submission that never had its answers submitted."""
+    submission.earned_points = submission.total_points = 0
+    submission.score = 0
+    submission.end_time = deadline(submission)
+    submission.is_completed = True
+    submission.save(update_fields=['earned_points', 'total_points', 'score', 'end_time', 'is_completed'])
+    record_completion(submission, [])
+    record_progress(submission)
+
+
+def reap_abandoned(now=None, batch_size=1000):
+    """Close the open submissions whose time limit ran out; return how many.
+
+    Each time limit is one range scan of the partial ``start_time`` index
+    over open submissions. Expired submissions are closed in batches, at their deadline and
+    graded on whatever answers they have. Submissions of tests without a
+    time limit (``time_limit`` of 0) stay open.
+    """
+    now = now or timezone.now()
+    reaped = 0
+    test_ids = set()
+    time_limits = Test.objects.filter(time_limit__gt=0).values_list('time_limit', flat=True).distinct().order_by()
+    for time_limit in time_limits:
+        duration = timedelta(minutes=time_limit)
+        expired_ids = TestSubmission.objects.filter(
+            is_completed=False, start_time__lt=now - duration - GRACE_PERIOD, test__time_limit=time_limit,
+        ).values_list('pk', flat=True)
+        for ids in chunks(list(expired_ids), batch_size):
+            with transaction.atomic():
+                # Submissions being graded right now are theirs to close
+                ids = list(
+                    TestSubmission.objects.select_for_update(skip_locked=True)
+                    .filter(pk__in=ids, is_completed=False).values_list('pk', flat=True)
+                )
+                closing = TestSubmission.objects.filter(pk__in=ids)
+                reaped += closing.update(is_completed=True, score=0, end_time=F('start_time') + duration)
+                rebuild_scores(closing)
+                rebuild_progress(closing)
+                test_ids.update(closing.values_list('test_id', flat=True).distinct())
+    rebuild_test_stats(sorted(test_ids))
+    return reaped
@@ -0,0 +1,164 @@
+"""Course bundles: courses with their lessons, tests, questions and choices.
+
+A bundle is a JSON Lines file, gzip compressed when its name ends in
+``.gz``. The first line is a header carrying the format version; every
+other line is one row tagged with its ``type``. Rows reference their parent
+by the ``ref`` it had in the exporting database, and parents always come
+before their children.
+
+Exports stream each table with ``iterator()``. Imports read the file line
+by line, buffer rows per table and ``bulk_create`` them in dependency order
+inside one transaction, so existing courses are never touched and a broken
+bundle leaves nothing behind.
+"""
+import gzip
+import json
+import zlib
+
+from django.db import transaction
+
+from .content_cache import invalidate_courses
+from .models import Choice, Course, Lesson, Question, Test
+
+FORMAT = 'graphicourse-bundle'
+VERSION = 1
+
+BATCH_SIZE = 2000
+
+# type, model, parent type and foreign key, fields, in dependency order
+TABLES = [
+    ('course', Course, None, None, ['name', 'description']),
+    ('lesson', Lesson, 'course', 'course_id', ['title', 'description', 'short_description', 'video_url']),
+    ('test', Test, 'lesson', 'lesson_id', ['title', 'description', 'passing_score', 'time_limit', 'max_attempts', 'attempt_cooldown']),
+    ('question', Question, 'test', 'test_id',
+     ['text', 'question_type', 'points', 'order', 'correct_answer', 'explanation']),
+    ('choice', Choice, 'question', 'question_id', ['text', 'is_correct']),
+]
+
+# Lookup from each type to its course, so exports filter by the course ids
+# alone rather than by every id of the table above
+COURSE_PATHS = {
+    'course': 'pk',
+    'lesson': 'course_id',
+    'test': 'lesson__course_id',
+    'question': 'test__lesson__course_id',
+    'choice': 'question__test__lesson__course_id',
+}
+
+
+class BundleError(ValueError):
+    pass
+
+
+def open_bundle(path, mode):
+    """Open a bundle for text reading or writing, gzipped if it ends in .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def export_courses(course_ids, out):
+    """Write the given courses to a text stream; return the rows per type."""
+    counts = {}
+    out.write(json.dumps({'type': 'header', 'format': FORMAT, 'version': VERSION}) + '\n')
+    course_ids = list(course_ids)
+    for row_type, model, parent_type, parent_field, fields in TABLES:
+        rows = model._default_manager.filter(**{f'{COURSE_PATHS[row_type]}__in': course_ids}).order_by('pk')
+        keys = ['pk'] + ([parent_field] if parent_field else []) + fields
+        counts[row_type] = 0
+        for values in rows.values_list(*keys).iterator(chunk_size=BATCH_SIZE):
+            record = {'type': row_type, 'ref': values[0]}
+            if parent_field:
+                record[parent_type] = values[1]
+            record.update(zip(fields, values[-len(fields):]))
+            out.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            counts[row_type] += 1
+    return counts
+
+
+class _Importer:
+    def __init__(self):
+        self.tables = {row_type: table for row_type, *table in TABLES}
+        self.buffers = {row_type: [] for row_type in self.tables}
+        # Bundle ref to new primary key, per type
+        self.pks = {row_type: {} for row_type in self.tables}
+        self.buffered = 0
+
+    def add(self, record):
+        row_type = record.get('type')
+        if row_type not in self.tables:
+            raise BundleError(f"Unknown row type {row_type!r}")
+        if 'ref' not in record:
+            raise BundleError(f"{row_type} row without a ref")
+        self.buffers[row_type].append(record)
+        self.buffered += 1
+        if self.buffered >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        # Parents are flushed first, so children in the same batch resolve
+        for row_type, (model, parent_type, parent_field, fields) in self.tables.items():
+            records = self.buffers[row_type]
+            if not records:
+                continue
+            objects = []
+            for record in records:
+                values = {field: record[field] for field in fields if field in record}
+                if parent_field:
+                    try:
+                        values[parent_field] = self.pks[parent_type][record[parent_type]]
+                    except KeyError:
+                        raise BundleError(
+                            f"{row_type} {record.get('ref')} refers to unknown {parent_type} {record.get(parent_type)}"
+                        ) from None
+                objects.append(model(**values))
+            model._default_manager.bulk_create(objects)
+            if row_type != 'choice':
+                self.pks[row_type].update(
+                    (record['ref'], obj.pk) for record, obj in zip(records, objects)
+                )
+            records.clear()
+        self.buffered = 0
+
+
+def _readable(lines):
+    """Iterate over lines, turning undecodable or corrupt input into BundleError."""
+    try:
+        yield from lines
+    except (UnicodeDecodeError, OSError, EOFError, zlib.error) as error:
+        raise BundleError(f"Unreadable bundle: {error}") from None
+
+
+@transaction.atomic
+def import_courses(lines):
+    """Create the courses of a bundle read from an iterable of lines.
+
+    Returns the rows created per type.
+    """
+    lines = _readable(lines)
+    try:
+        header = json.loads(next(lines, 'null'))
+    except json.JSONDecodeError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise BundleError("Not a course bundle")
+    if header.get('version') != VERSION:
+        raise BundleError(f"Unsupported bundle version {header.get('version')!r}")
+
+    importer = _Importer()
+    counts = {row_type: 0 for row_type in importer.tables}
+    for number, line in enumerate(lines, start=2):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise BundleError(f"Line {number}: {error}") from None
+        if not isinstance(record, dict):
+            raise BundleError(f"Line {number}: not a JSON object")
+        importer.add(record)
+        counts[record['type']] += 1
+    importer.flush()
+    # bulk_create sends no signals; a database may hand out ids again
+    invalidate_courses(importer.pks['course'].values())
+    return counts
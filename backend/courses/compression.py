@@ -0,0 +1,82 @@
+"""Precompressed JSON bodies for cached course content.
+
+Lesson descriptions carry large inline HTML and CSS, so the content cache
+stores each payload rendered to JSON and compressed with gzip and, when
+the ``brotli`` package is installed, brotli. Responses are then served
+in the best encoding the client accepts without compressing anything per
+request.
+"""
+import gzip
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IDENTITY = 'identity'
+
+# Compression runs in the request that misses the cache, per process and
+# query string, so the levels stop where extra CPU buys little size
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, mode=brotli.MODE_TEXT, quality=5)
+
+# Preferred first when the client rates several equally
+PREFERENCE = ['br', 'gzip', IDENTITY]
+
+
+def compress_payload(payload):
+    """Render a payload to JSON once, in every available encoding."""
+    body = JSONRenderer().render(payload)
+    bodies = {IDENTITY: body}
+    for encoding, compress in COMPRESSORS.items():
+        bodies[encoding] = compress(body)
+    return bodies
+
+
+def negotiate(accept_encoding):
+    """Pick the encoding to serve for an Accept-Encoding header."""
+    ratings = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        ratings[name] = quality
+
+    def rating(encoding):
+        if encoding in ratings:
+            return ratings[encoding]
+        if encoding == IDENTITY:
+            return 1.0 if ratings.get('*', 1.0) > 0 else 0.0
+        return ratings.get('*', 0.0)
+
+    available = [encoding for encoding in PREFERENCE if encoding == IDENTITY or encoding in COMPRESSORS]
+    best = max(available, key=lambda encoding: (rating(encoding), -available.index(encoding)))
+    return best if rating(best) > 0 else IDENTITY
+
+
+class PrecompressedResponse(Response):
+    """A JSON Response whose body was rendered and compressed ahead of time."""
+
+    def __init__(self, data, body, encoding, **kwargs):
+        super().__init__(data, **kwargs)
+        self.body = body
+        self.encoding = encoding
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        if self.encoding != IDENTITY:
+            self['Content-Encoding'] = self.encoding
+        return self.body
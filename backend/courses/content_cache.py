@@ -0,0 +1,106 @@
+"""Cache of the serialized course, lesson and test payloads.
+
+Course content is read on every page view and changes rarely, so the
+retrieve endpoints keep their payloads in the ``content`` cache (local
+memory unless ``CONTENT_CACHE_URL`` points at a directory or Redis). Every
+entry records the course it belongs to and that course's content version;
+any change to a course, lesson, test, question or choice bumps the version
+of its course once it commits (see ``courses.signals``), which turns all
+of the course's entries stale at once. A hit costs two cache reads and no
+queries.
+
+The same events bubble ``updated_at`` up from questions and choices to
+their test, from a test to its lesson, and from everything to the course,
+so the course row alone tells when any of its content last changed.
+"""
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Course, Lesson, Test
+
+CACHE_ALIAS = 'content'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(course_id):
+    return f'courses:content-version:{course_id}'
+
+
+def current_version(key):
+    """Return the version stored under ``key``, starting one if there is none."""
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        # add() keeps the version if another process set one meanwhile
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def course_version(course_id):
+    """Return the current content version of a course."""
+    return current_version(_version_key(course_id))
+
+
+def payload_key(kind, lookup, query_params):
+    """Cache key of one representation: object, URL kwargs and query string."""
+    objects = ':'.join(f'{name}={value}' for name, value in sorted(lookup.items()))
+    query = urlencode(sorted(query_params.lists()), doseq=True)
+    return f'courses:content:{kind}:{objects}:{query}'
+
+
+def get_payload(key):
+    """Return the cached payload under ``key``, or None if missing or stale."""
+    cache = _cache()
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    course_id, version, payload = entry
+    if cache.get(_version_key(course_id)) != version:
+        return None
+    return payload
+
+
+def set_payload(key, course_id, version, payload):
+    """Store a payload built while the course was at ``version``."""
+    _cache().set(key, (course_id, version, payload), CACHE_TIMEOUT)
+
+
+def invalidate_courses(course_ids):
+    """Make the cached content of the given courses stale once the change commits.
+
+    Bumping earlier would let a request reading the old rows meanwhile
+    store them under the new version.
+    """
+    course_ids = [course_id for course_id in course_ids if course_id]
+
+    def bump():
+        version = time.time_ns()
+        _cache().set_many({_version_key(course_id): version for course_id in course_ids}, None)
+    transaction.on_commit(bump)
+
+
+def touch(course_ids, lesson_ids=(), test_ids=()):
+    """Record a change below the given objects: bump their updated_at and the cache."""
+    now = timezone.now()
+    course_ids = [course_id for course_id in course_ids if course_id]
+    if test_ids:
+        Test.objects.filter(pk__in=test_ids).update(updated_at=now)
+    if lesson_ids:
+        Lesson.objects.filter(pk__in=lesson_ids).update(updated_at=now)
+    if course_ids:
+        Course.objects.filter(pk__in=course_ids).update(updated_at=now)
+    invalidate_courses(course_ids)
+
+
+def touch_test(test_id):
+    """Record a change to a test's questions or choices."""
+    touch(Test.objects.filter(pk=test_id).values_list('lesson__course_id', flat=True), test_ids=[test_id])
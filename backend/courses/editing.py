@@ -0,0 +1,128 @@
+"""Set-based writes of a test's nested questions and choices.
+
+The editor sends the whole question tree on every save. Instead of
+recreating it row by row, the incoming questions and choices are matched to
+the stored ones by id and applied with ``bulk_create``, ``bulk_update`` and
+one batched delete per table, so saving a test takes the same handful of
+queries however many questions it has. Questions keep their ids across
+saves, and with them the answers and statistics that point at them.
+
+Bulk writes send no ``post_save`` signals, and the ``post_delete`` ones
+the deletes send are ignored (each would look up its test and invalidate
+it again), so the test's answer key and content version are updated here
+once, when the tree has been written and committed.
+"""
+from django.db import transaction
+
+from .answer_keys import invalidate_answer_key
+from .content_cache import touch_test
+from .models import Choice, Question
+from .signals import question_receivers_muted
+
+QUESTION_FIELDS = ['text', 'question_type', 'points', 'order', 'correct_answer', 'explanation']
+CHOICE_FIELDS = ['text', 'is_correct']
+
+
+def _assign(instance, data, fields):
+    """Copy the given fields onto an instance, returning whether any changed."""
+    changed = False
+    for field in fields:
+        if field in data and getattr(instance, field) != data[field]:
+            setattr(instance, field, data[field])
+            changed = True
+    return changed
+
+
+def _diff(existing, items, build, fields):
+    """Match incoming items to ``existing`` (id to instance) by their ``id``.
+
+    Returns the instance for every item in order, along with the new
+    instances, the changed instances and the ids no item refers to any
+    more. Missing, unknown and repeated ids are treated as new rows.
+    """
+    instances, created, updated, kept = [], [], [], set()
+    for data in items:
+        instance = existing.get(data.get('id'))
+        if instance is None or instance.id in kept:
+            instance = build(data)
+            created.append(instance)
+        else:
+            kept.add(instance.id)
+            if _assign(instance, data, fields):
+                updated.append(instance)
+        instances.append(instance)
+    return instances, created, updated, set(existing) - kept
+
+
+def _fields(data, fields):
+    return {field: data[field] for field in fields if field in data}
+
+
+def write_choices(questions):
+    """Sync the choices of saved questions from ``(question, choices_data)`` pairs.
+
+    ``choices_data`` of ``None`` leaves a question's choices untouched; a
+    list replaces them, keeping the choices whose ids it repeats.
+    """
+    questions = [(question, items) for question, items in questions if items is not None]
+    if not questions:
+        return
+
+    existing = {}
+    for choice in Choice.objects.filter(question__in=[question for question, _ in questions]):
+        existing.setdefault(choice.question_id, {})[choice.id] = choice
+
+    created, updated, stale = [], [], set()
+    for question, items in questions:
+        _, new, changed, removed = _diff(
+            existing.get(question.id, {}), items,
+            lambda data: Choice(question=question, **_fields(data, CHOICE_FIELDS)),
+            CHOICE_FIELDS,
+        )
+        created += new
+        updated += changed
+        stale |= removed
+
+    if stale:
+        with question_receivers_muted():
+            Choice.objects.filter(id__in=stale).delete()
+    if updated:
+        Choice.objects.bulk_update(updated, CHOICE_FIELDS)
+    if created:
+        Choice.objects.bulk_create(created)
+
+
+@transaction.atomic
+def write_questions(test, questions_data):
+    """Make a test's questions and their choices match ``questions_data``."""
+    existing = {question.id: question for question in Question.objects.filter(test=test)}
+    questions, created, updated, stale = _diff(
+        existing, questions_data,
+        lambda data: Question(test=test, **_fields(data, QUESTION_FIELDS)),
+        QUESTION_FIELDS,
+    )
+
+    if stale:
+        # Answers to removed questions go with them, as they always did
+        with question_receivers_muted():
+            Question.objects.filter(id__in=stale).delete()
+    if updated:
+        Question.objects.bulk_update(updated, QUESTION_FIELDS)
+    if created:
+        Question.objects.bulk_create(created)
+
+    write_choices([(question, data.get('choices')) for question, data in zip(questions, questions_data)])
+
+    # Both take effect when the transaction commits
+    invalidate_answer_key(test.id)
+    touch_test(test.id)
+    return test
+
+
+@transaction.atomic
+def write_question(question, choices_data):
+    """Sync the choices of a single saved question."""
+    write_choices([(question, choices_data)])
+    invalidate_answer_key(question.test_id)
+    touch_test(question.test_id)
+    return question
@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from django.db.models import Case, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import serializers
+
+from .answer_keys import get_answer_key
+from .models import Answer, QuestionType, TestSubmission
+from .progress import rebuild_progress, record_progress
+from .scoring import score_open_answers
+from .serializers import SubmitAnswerSerializer
+from .stats import rebuild_test_stats, record_completion, record_review
+
+
+def choices_correct(key, selected):
+    """Correct when all correct choices are selected and no incorrect ones."""
+    return frozenset(selected) == key.correct_choice_ids
+
+
+def grade_submission(submission, answers_data):
+    """Grade a submission's answers in memory and store them in bulk.
+
+    Correctness comes from the test's cached answer key, and answers and
+    their selected choices are written with one ``bulk_create`` each, so the
+    number of queries does not depend on the number of answers.
+    """
+    serializer = SubmitAnswerSerializer(data=answers_data, many=True)
+    serializer.is_valid(raise_exception=True)
+
+    answer_key = get_answer_key(submission.test_id)
+
+    answers = []
+    selections = []
+    open_answers = []
+    total_points = 0
+
+    for data in serializer.validated_data:
+        question_id = data['question_id']
+        key = answer_key.get(question_id)
+        if key is None:
+            raise Http404("No Question matches the given query.")
+
+        text_answer = data.get('text_answer', '')
+        selected_choice_ids = data.get('selected_choice_ids', [])
+        if key.question_type == QuestionType.MULTIPLE_CHOICE and not selected_choice_ids:
+            raise serializers.ValidationError("Multiple choice questions require selected choices")
+        if key.question_type == QuestionType.OPEN_ENDED and not text_answer:
+            raise serializers.ValidationError("Open ended questions require a text answer")
+
+        total_points += key.points
+        answer = Answer(submission=submission, question_id=question_id, text_answer=text_answer)
+
+        if key.question_type == QuestionType.MULTIPLE_CHOICE:
+            selected = key.choice_ids.intersection(selected_choice_ids)
+            answer.is_correct = choices_correct(key, selected)
+            selections.append((answer, selected))
+        else:
+            open_answers.append((answer, key))
+        answers.append(answer)
+
+    scores = score_open_answers([(key, answer.text_answer) for answer, key in open_answers])
+    for (answer, key), score in zip(open_answers, scores):
+        answer.is_correct, answer.feedback = score.is_correct, score.feedback
+
+    earned_points = sum(answer_key[answer.question_id].points for answer in answers if answer.is_correct)
+
+    Answer.objects.bulk_create(answers)
+    SelectedChoice = Answer.selected_choices.through
+    SelectedChoice.objects.bulk_create([
+        SelectedChoice(answer_id=answer.id, choice_id=choice_id)
+        for answer, selected in selections
+        for choice_id in selected
+    ])
+
+    submission.earned_points = earned_points
+    submission.total_points = total_points
+    submission.score = (earned_points / total_points) * 100 if total_points > 0 else 0
+    submission.end_time = timezone.now()
+    submission.is_completed = True
+    submission.save(update_fields=['earned_points', 'total_points', 'score', 'end_time', 'is_completed'])
+    record_completion(submission, answers)
+    record_progress(submission)
+    return submission
+
+
+def score_expression(earned_points, total_points=F('total_points')):
+    """Percentage score for an UPDATE, leaving the score alone without points."""
+    return Case(
+        When(GreaterThan(total_points, 0), then=ExpressionWrapper(
+            earned_points * 100.0 / total_points, output_field=FloatField()
+        )),
+        default=F('score'),
+    )
+
+
+def apply_review(answer, is_correct):
+    """Adjust the submission's counters after a review changed ``answer.is_correct``.
+
+    ``answer`` still carries the old outcome. Only the difference is applied,
+    with F() expressions, so a review costs a constant number of queries
+    whatever the test size. The submission row is locked so the test
+    statistics see the scores in the order the reviews are applied.
+    """
+    correct_delta = int(is_correct is True) - int(answer.is_correct is True)
+    if not correct_delta:
+        return
+    submission = (
+        TestSubmission.objects.select_related('test').select_for_update(of=('self',))
+        .only('id', 'test_id', 'test__passing_score', 'score', 'earned_points', 'total_points', 'is_completed')
+        .get(pk=answer.submission_id)
+    )
+    delta = answer.question.points * correct_delta
+    if delta:
+        earned_points = F('earned_points') + delta
+        TestSubmission.objects.filter(pk=submission.pk).update(
+            earned_points=earned_points,
+            score=score_expression(earned_points),
+        )
+    if submission.is_completed:
+        new_score = submission.score
+        if submission.total_points > 0:
+            new_score = (submission.earned_points + delta) * 100.0 / submission.total_points
+        record_review(submission, answer.question_id, correct_delta, submission.score, new_score)
+        rebuild_progress(TestSubmission.objects.filter(pk=submission.pk))
+
+
+def chunks(items, size):
+    """Split a list into consecutive slices of at most ``size`` items."""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def apply_reviews(reviews, batch_size=1000):
+    """Apply many open-answer reviews at once.
+
+    ``reviews`` maps answer id to ``(is_correct, feedback)``. Answers are
+    written with ``bulk_update`` and every affected submission is rescored
+    exactly once, then the statistics of the tests involved are rebuilt.
+    Returns ``(answers, submission_ids)``.
+    """
+    answers = []
+    for ids in chunks(list(reviews), batch_size):
+        answers.extend(
+            Answer.objects.filter(pk__in=ids, question__question_type=QuestionType.OPEN_ENDED)
+            .only('id', 'submission_id', 'is_correct', 'feedback')
+        )
+    if len(answers) != len(reviews):
+        missing = sorted(set(reviews) - {answer.id for answer in answers})
+        raise serializers.ValidationError({"answer_ids": missing, "detail": "Unknown or not open-ended answers."})
+
+    # Reviews sharing an outcome and feedback become one UPDATE per batch;
+    # the rest go through bulk_update, whose CASE expressions get costly.
+    groups = defaultdict(list)
+    for answer in answers:
+        answer.is_correct, answer.feedback = reviews[answer.id]
+        groups[reviews[answer.id]].append(answer)
+    distinct = []
+    for (is_correct, feedback), group in groups.items():
+        if len(group) == 1:
+            distinct.extend(group)
+            continue
+        for batch in chunks(group, batch_size):
+            Answer.objects.filter(pk__in=[answer.id for answer in batch]).update(
+                is_correct=is_correct, feedback=feedback
+            )
+    Answer.objects.bulk_update(distinct, ['is_correct', 'feedback'], batch_size=batch_size)
+
+    submission_ids = sorted({answer.submission_id for answer in answers})
+    test_ids = set()
+    for ids in chunks(submission_ids, batch_size):
+        submissions = TestSubmission.objects.filter(pk__in=ids)
+        rebuild_scores(submissions)
+        rebuild_progress(submissions)
+        test_ids.update(submissions.values_list('test_id', flat=True).distinct())
+    rebuild_test_stats(sorted(test_ids))
+    return answers, submission_ids
+
+
+def point_totals():
+    """Aggregate subqueries of (earned, total) points over a submission's answers."""
+    answers = Answer.objects.filter(submission=OuterRef('pk')).order_by().values('submission')
+    total = answers.annotate(points=Sum('question__points')).values('points')
+    earned = answers.filter(is_correct=True).annotate(points=Sum('question__points')).values('points')
+    return Coalesce(Subquery(earned), 0), Coalesce(Subquery(total), 0)
+
+
+def rebuild_scores(submissions):
+    """Recompute the counters and score of submissions from their answers.
+
+    Runs as a single UPDATE with aggregate subqueries; returns the number of
+    submissions updated.
+    """
+    earned_points, total_points = point_totals()
+    return submissions.update(
+        earned_points=earned_points,
+        total_points=total_points,
+        score=score_expression(earned_points, total_points),
+    )
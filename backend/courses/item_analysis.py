@@ -0,0 +1,174 @@
+"""Classical item analysis of a test's completed submissions.
+
+The answers of a test are read in one query as rows of ``(submission,
+question, correct, selected choice)`` and turned into a submissions x
+questions response matrix, from which every statistic is computed with
+vectorized NumPy operations:
+
+* discrimination index: correct rate of the top 27% of submissions by
+  score minus that of the bottom 27%;
+* point-biserial correlation of each question with the rest of the score;
+* selection frequency of every choice, distractors included;
+* Cronbach's alpha of the whole test.
+
+Unanswered questions count as incorrect. Results are stored on the
+``TestStats``, ``QuestionStats`` and ``ChoiceStats`` rows.
+"""
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .answer_keys import get_answer_key
+from .models import Answer, ChoiceStats, QuestionStats, TestStats
+
+# Kelley's group size for the discrimination index
+GROUP_SHARE = 0.27
+
+
+def response_rows(test_id):
+    """The answers of a test as an ``(n, 4)`` integer array.
+
+    Columns are submission id, question id, 1 if correct else 0, and the
+    selected choice id (0 when none); an answer with several selected
+    choices spans several rows.
+    """
+    rows = (
+        Answer.objects.filter(submission__test_id=test_id, submission__is_completed=True)
+        .annotate(
+            correct=Case(When(is_correct=True, then=Value(1)), default=Value(0), output_field=IntegerField()),
+            choice=Coalesce('selected_choices', Value(0)),
+        )
+        .order_by()
+        .values_list('submission_id', 'question_id', 'correct', 'choice')
+    )
+    flat = np.fromiter(chain.from_iterable(rows.iterator(chunk_size=10000)), dtype=np.int64)
+    return flat.reshape(-1, 4)
+
+
+def correlations(items, totals):
+    """Pearson correlation of every column of ``items`` with the matching column of ``totals``."""
+    items = items - items.mean(axis=0)
+    totals = totals - totals.mean(axis=0)
+    denominator = np.sqrt((items ** 2).sum(axis=0) * (totals ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, (items * totals).sum(axis=0) / denominator, np.nan)
+
+
+def analyze(rows, question_ids, points, choice_ids):
+    """Compute the item statistics from response rows.
+
+    ``question_ids`` and ``choice_ids`` are sorted arrays and ``points``
+    holds the points of each question. Returns a dict of NumPy results, with
+    NaN where a statistic is undefined (e.g. a question everyone got right).
+    """
+    submission_ids, submission_index = np.unique(rows[:, 0], return_inverse=True)
+    question_index = np.searchsorted(question_ids, rows[:, 1])
+    submission_count, question_count = len(submission_ids), len(question_ids)
+
+    answered = np.zeros((submission_count, question_count), dtype=bool)
+    correct = np.zeros((submission_count, question_count), dtype=np.float64)
+    answered[submission_index, question_index] = True
+    correct[submission_index, question_index] = rows[:, 2]
+
+    item_scores = correct * points
+    totals = item_scores.sum(axis=1)
+
+    group = max(int(round(submission_count * GROUP_SHARE)), 1)
+    order = np.argsort(totals, kind='stable')
+    discrimination = correct[order[-group:]].mean(axis=0) - correct[order[:group]].mean(axis=0)
+    if submission_count < 2:
+        discrimination[:] = np.nan
+
+    # Correlate with the rest of the score so an item is not compared with itself
+    point_biserial = correlations(correct, totals[:, None] - item_scores)
+
+    alpha = np.nan
+    total_variance = totals.var(ddof=1) if submission_count > 1 else 0
+    if question_count > 1 and total_variance > 0:
+        item_variance = item_scores.var(axis=0, ddof=1).sum()
+        alpha = question_count / (question_count - 1) * (1 - item_variance / total_variance)
+
+    # Each (answer, choice) pair is one row, so counting rows counts selections
+    selected_rows = rows[:, 3] != 0
+    choice_index = np.searchsorted(choice_ids, rows[selected_rows, 3])
+    choice_selected = np.bincount(choice_index, minlength=len(choice_ids))
+
+    return {
+        'submissions': submission_count,
+        'answered': answered.sum(axis=0),
+        'discrimination': discrimination,
+        'point_biserial': point_biserial,
+        'cronbach_alpha': alpha,
+        'choice_selected': choice_selected,
+    }
+
+
+def as_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def analyze_test(test_id):
+    """Run the item analysis of a test and store the results.
+
+    Returns the number of submissions analyzed.
+    """
+    answer_key = get_answer_key(test_id)
+    question_ids = np.array(sorted(answer_key), dtype=np.int64)
+    points = np.array([answer_key[question_id].points for question_id in question_ids], dtype=np.float64)
+    choice_question = {
+        choice_id: question_id
+        for question_id, key in answer_key.items()
+        for choice_id in key.choice_ids
+    }
+    choice_ids = np.array(sorted(choice_question), dtype=np.int64)
+
+    rows = response_rows(test_id)
+    if not len(rows) or not len(question_ids):
+        with transaction.atomic():
+            TestStats.objects.update_or_create(test_id=test_id, defaults={
+                'cronbach_alpha': None, 'analyzed_submissions': 0, 'analyzed_at': timezone.now(),
+            })
+            QuestionStats.objects.filter(test_id=test_id).update(discrimination=None, point_biserial=None)
+            ChoiceStats.objects.filter(question_stats__test_id=test_id).delete()
+        return 0
+
+    results = analyze(rows, question_ids, points, choice_ids)
+    answered = dict(zip(question_ids.tolist(), results['answered'].tolist()))
+
+    with transaction.atomic():
+        TestStats.objects.update_or_create(test_id=test_id, defaults={
+            'cronbach_alpha': as_float(results['cronbach_alpha']),
+            'analyzed_submissions': results['submissions'],
+            'analyzed_at': timezone.now(),
+        })
+        QuestionStats.objects.bulk_create(
+            [QuestionStats(question_id=question_id, test_id=test_id) for question_id in answered],
+            ignore_conflicts=True,
+        )
+        QuestionStats.objects.bulk_update([
+            QuestionStats(
+                question_id=question_id,
+                discrimination=as_float(discrimination),
+                point_biserial=as_float(point_biserial),
+            )
+            for question_id, discrimination, point_biserial in zip(
+                answered, results['discrimination'], results['point_biserial']
+            )
+        ], ['discrimination', 'point_biserial'], batch_size=500)
+
+        ChoiceStats.objects.filter(question_stats__test_id=test_id).delete()
+        choice_stats = []
+        for choice_id, selected in zip(choice_ids.tolist(), results['choice_selected'].tolist()):
+            question_id = choice_question[choice_id]
+            choice_stats.append(ChoiceStats(
+                choice_id=choice_id,
+                question_stats_id=question_id,
+                selected=selected,
+                selection_rate=selected / answered[question_id] if answered[question_id] else 0,
+            ))
+        ChoiceStats.objects.bulk_create(choice_stats, batch_size=1000)
+    return results['submissions']
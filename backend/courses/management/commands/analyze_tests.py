@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.item_analysis import analyze_test
+from courses.models import Test, TestStats
+
+
+class Command(BaseCommand):
+    help = 'Runs the item analysis (discrimination, point-biserial, distractors, alpha) of tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='+', help='Analyze these tests')
+        parser.add_argument('--course', type=int, help='Analyze the tests of this course')
+
+    def handle(self, *args, **options):
+        if options['test']:
+            tests = Test.objects.filter(pk__in=options['test'])
+        elif options['course']:
+            tests = Test.objects.filter(lesson__course_id=options['course'])
+        else:
+            tests = Test.objects.filter(pk__in=TestStats.objects.filter(completions__gt=0).values('test_id'))
+        test_ids = sorted(tests.values_list('pk', flat=True))
+        if (options['test'] or options['course']) and not test_ids:
+            raise CommandError("No tests selected")
+
+        for test_id in test_ids:
+            start = time.perf_counter()
+            submissions = analyze_test(test_id)
+            self.stdout.write(f"Test {test_id}: {submissions} submissions analyzed in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,247 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from courses.answer_keys import get_answer_key
+from courses.grading import apply_reviews, grade_submission
+from courses.item_analysis import analyze_test
+from courses.scoring import get_scorer
+from courses.models import Answer, Choice, Course, Lesson, Question, QuestionType, Test, TestSubmission
+
+
+class Rollback(Exception):
+    """Raised to throw away the rows a benchmark created."""
+
+
+class Command(BaseCommand):
+    help = 'Runs a benchmark scenario against throwaway data (rolled back afterwards)'
+
+    scenarios = {
+        'lesson_list': 'bench_lesson_list',
+        'submit_test': 'bench_submit_test',
+        'bulk_review': 'bench_bulk_review',
+        'score_open': 'bench_score_open',
+        'item_analysis': 'bench_item_analysis',
+        'attempt_history': 'bench_attempt_history',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(self.scenarios))
+        parser.add_argument('--size', type=int, default=500, help='Number of rows to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement')
+
+    def handle(self, *args, **options):
+        method = getattr(self, self.scenarios[options['scenario']])
+        try:
+            with transaction.atomic():
+                method(options['size'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, label, func, repeat):
+        """Run func repeat times and report the best wall-clock time."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        self.stdout.write(f"{label}: {best * 1000:.1f} ms (best of {repeat})")
+        return best
+
+    def count_queries(self, func):
+        """Run func once and return the number of queries it made."""
+        # The query log keeps only the last 9000 queries; once setup filled
+        # it, the capture would see no growth at all
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def create_test(self, question_count):
+        """A test with four choices per question and every fifth question open-ended."""
+        if question_count <= 0:
+            raise CommandError("--size must be positive")
+        course = Course.objects.create(name="Benchmark course", description="")
+        lesson = Lesson.objects.create(course=course, title="Benchmark lesson", video_url="https://example.com/video")
+        test = Test.objects.create(lesson=lesson, title="Benchmark test")
+        questions = Question.objects.bulk_create([
+            Question(
+                test=test,
+                text=f"Question {i}",
+                order=i,
+                question_type=QuestionType.OPEN_ENDED if i % 5 == 0 else QuestionType.MULTIPLE_CHOICE,
+                correct_answer="rasterization, antialiasing, interpolation" if i % 5 == 0 else None,
+            )
+            for i in range(question_count)
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=question, text=f"Choice {j}", is_correct=j == 0)
+            for question in questions
+            if question.question_type == QuestionType.MULTIPLE_CHOICE
+            for j in range(4)
+        ])
+        return test
+
+    def answers_for(self, test):
+        answers = []
+        for question in test.questions.prefetch_related('choices'):
+            if question.question_type == QuestionType.OPEN_ENDED:
+                answers.append({'question_id': question.id, 'text_answer': "Rasterization with antialiasing"})
+            else:
+                answers.append({'question_id': question.id, 'selected_choice_ids': [question.choices.all()[0].id]})
+        return answers
+
+    def bench_lesson_list(self, size, repeat):
+        """Materialize a large lesson list with and without the quiz column."""
+        if size <= 0:
+            raise CommandError("--size must be positive")
+        course = Course.objects.create(name="Benchmark course", description="")
+        quiz = {
+            'questions': [
+                {'question': f"Question {i} " * 10, 'choices': [f"Choice {j} " * 5 for j in range(4)], 'correctIndex': 0}
+                for i in range(20)
+            ]
+        }
+        Lesson.objects.bulk_create([
+            Lesson(course=course, title=f"Lesson {i}", video_url="https://example.com/video", quiz=quiz)
+            for i in range(size)
+        ])
+        lessons = Lesson.objects.filter(course=course)
+
+        with_quiz = self.measure("with quiz", lambda: list(lessons.with_quiz()), repeat)
+        deferred = self.measure("quiz deferred", lambda: list(lessons.all()), repeat)
+        self.stdout.write(f"saved {(with_quiz - deferred) * 1000:.1f} ms for {size} lessons")
+
+    def bench_submit_test(self, size, repeat):
+        """Grade submissions of a test with --size questions."""
+        test = self.create_test(size)
+        answers = self.answers_for(test)
+
+        for state in ("cold", "warm"):
+            submission = TestSubmission.objects.create(test=test)
+            queries = self.count_queries(lambda: grade_submission(submission, answers))
+            self.stdout.write(f"{queries} queries to grade {size} answers ({state} answer key)")
+        self.measure(
+            "grade submission",
+            lambda: grade_submission(TestSubmission.objects.create(test=test), answers),
+            repeat,
+        )
+
+    def bench_bulk_review(self, size, repeat):
+        """Review --size open answers spread over submissions of ten answers each."""
+        test = self.create_test(10)
+        open_questions = list(test.questions.filter(question_type=QuestionType.OPEN_ENDED))
+        submissions = TestSubmission.objects.bulk_create([
+            TestSubmission(test=test, is_completed=True) for _ in range(size // len(open_questions) + 1)
+        ])
+        answers = Answer.objects.bulk_create([
+            Answer(submission=submission, question=question, text_answer="Unsure")
+            for submission in submissions
+            for question in open_questions
+        ][:size])
+        flip = [True]
+
+        def review():
+            flip[0] = not flip[0]
+            apply_reviews({answer.id: (flip[0], "Reviewed") for answer in answers})
+
+        self.stdout.write(f"{self.count_queries(review)} queries to review {len(answers)} answers")
+        self.measure("bulk review", review, repeat)
+
+    def bench_score_open(self, size, repeat):
+        """Score --size open answers spread over the open questions of a test."""
+        test = self.create_test(50)
+        keys = [key for key in get_answer_key(test.id).values() if key.question_type == QuestionType.OPEN_ENDED]
+        texts = [
+            "Rasterization converts shapes to pixels",
+            "Antialiasing smooths the jagged edges, interpolation fills the gaps",
+            "I am not sure",
+        ]
+        items = [(keys[i % len(keys)], texts[i % len(texts)]) for i in range(size)]
+        scorer = get_scorer()
+
+        best = self.measure(f"score {size} answers with {type(scorer).__name__}", lambda: scorer.score_batch(items), repeat)
+        self.stdout.write(f"{size / best:,.0f} answers per second")
+
+    def bench_item_analysis(self, size, repeat):
+        """Item analysis of --size completed submissions of a 20 question test."""
+        test = self.create_test(20)
+        questions = list(test.questions.prefetch_related('choices'))
+        submissions = TestSubmission.objects.bulk_create(
+            [TestSubmission(test=test, is_completed=True) for _ in range(size)], batch_size=5000
+        )
+        # Abler students pick the correct (first) choice more often
+        rng = np.random.default_rng(0)
+        ability = rng.random(size)
+        picks = rng.random((size, len(questions))) < ability[:, None]
+        answers = []
+        selections = []
+        for row, submission in enumerate(submissions):
+            for column, question in enumerate(questions):
+                answer = Answer(submission=submission, question=question, is_correct=bool(picks[row, column]))
+                if question.question_type == QuestionType.MULTIPLE_CHOICE:
+                    choices = question.choices.all()
+                    selections.append((answer, choices[0] if picks[row, column] else choices[1 + (row + column) % 3]))
+                answers.append(answer)
+        Answer.objects.bulk_create(answers, batch_size=5000)
+        SelectedChoice = Answer.selected_choices.through
+        SelectedChoice.objects.bulk_create(
+            [SelectedChoice(answer_id=answer.id, choice_id=choice.id) for answer, choice in selections], batch_size=5000
+        )
+
+        queries = self.count_queries(lambda: analyze_test(test.id))
+        self.stdout.write(f"{queries} queries to analyze {size} submissions")
+        self.measure("item analysis", lambda: analyze_test(test.id), repeat)
+
+    def bench_attempt_history(self, size, repeat):
+        """Attempt lookups in a table of --size submissions by --size/20 users over ten tests."""
+        if size <= 0:
+            raise CommandError("--size must be positive")
+        tests = [self.create_test(1) for _ in range(10)]
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            [User(username=f"bench-{i}", email=f"bench-{i}@example.com") for i in range(max(size // 20, 1))],
+            batch_size=5000,
+        )
+        rng = np.random.default_rng(0)
+        user_picks = rng.integers(len(users), size=size)
+        test_picks = rng.integers(len(tests), size=size)
+        scores = rng.integers(0, 101, size=size)
+        completed = rng.random(size) < 0.9
+        now = timezone.now()
+        for start in range(0, size, 50000):
+            TestSubmission.objects.bulk_create([
+                TestSubmission(
+                    test=tests[test_picks[i]], user=users[user_picks[i]],
+                    score=float(scores[i]) if completed[i] else None,
+                    end_time=now - timedelta(minutes=int(i)) if completed[i] else None,
+                    is_completed=bool(completed[i]),
+                )
+                for i in range(start, min(start + 50000, size))
+            ], batch_size=5000)
+
+        user, test = users[0], tests[0]
+        lookups = {
+            "attempt history of a user": lambda: list(
+                TestSubmission.objects.filter(user=user).with_attempt_ranks().order_by('test_id', '-start_time')
+            ),
+            "best score of a user on a test": lambda: TestSubmission.objects.filter(
+                user=user, test=test, is_completed=True
+            ).aggregate(best=Max('score')),
+            "latest attempts at a test": lambda: list(
+                TestSubmission.objects.filter(test=test, end_time__isnull=False).order_by('-end_time')[:20]
+            ),
+        }
+        for label, lookup in lookups.items():
+            self.measure(f"{label} ({size} submissions)", lookup, repeat)
+        plan = TestSubmission.objects.filter(user=user, test=test, is_completed=True).explain()
+        self.stdout.write(f"best score plan: {plan.splitlines()[-1].strip()}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.bundles import export_courses, open_bundle
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Exports courses with their lessons, tests, questions and choices to a bundle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', type=int, nargs='*', help='Course ids to export')
+        parser.add_argument('--all', action='store_true', help='Export every course')
+        parser.add_argument('-o', '--output', help='Bundle file (.jsonl, or .jsonl.gz to compress); default stdout')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all() if options['all'] else Course.objects.filter(pk__in=options['course'])
+        course_ids = sorted(courses.values_list('pk', flat=True))
+        if not course_ids:
+            raise CommandError("No courses selected; pass course ids or --all")
+
+        if options['output']:
+            with open_bundle(options['output'], 'w') as out:
+                counts = export_courses(course_ids, out)
+        else:
+            counts = export_courses(course_ids, self.stdout)
+        summary = ", ".join(f"{count} {row_type}s" for row_type, count in counts.items())
+        self.stderr.write(f"Exported {summary}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from courses.reports import DATASETS, FORMATS, export
+
+
+class Command(BaseCommand):
+    help = 'Streams submissions or answers to a csv or jsonl file for reporting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', dest='output_format', choices=FORMATS, default='csv')
+        parser.add_argument('--test', type=int, action='append', default=[], help='Test id (repeatable)')
+        parser.add_argument('--course', type=int, help='Only the tests of this course')
+        parser.add_argument('-o', '--output', help='Output file; default stdout')
+
+    def handle(self, *args, **options):
+        pieces = export(options['dataset'], options['output_format'], options['test'], options['course'])
+        if not options['output']:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            out.writelines(pieces)
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.bundles import BundleError, import_courses, open_bundle
+
+
+class Command(BaseCommand):
+    help = 'Imports the courses of a bundle written by export_course, alongside the existing ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', help='Bundle file (.jsonl or .jsonl.gz)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with open_bundle(options['bundle'], 'r') as bundle:
+                counts = import_courses(bundle)
+        except (OSError, BundleError) as error:
+            raise CommandError(f"Could not import {options['bundle']}: {error}")
+        summary = ", ".join(f"{count} {row_type}s" for row_type, count in counts.items())
+        self.stdout.write(f"Imported {summary} in {time.perf_counter() - start:.2f} s")
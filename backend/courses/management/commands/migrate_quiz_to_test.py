@@ -6,7 +6,7 @@ class Command(BaseCommand):
     help = 'Migrates data from Lesson.quiz JSONField to Test model structure'
 
     def handle(self, *args, **options):
-        lessons_with_quiz = Lesson.objects.exclude(quiz={}).exclude(quiz=None)
+        lessons_with_quiz = Lesson.objects.with_quiz().select_related('test').exclude(quiz={}).exclude(quiz=None)
         self.stdout.write(f"Found {lessons_with_quiz.count()} lessons with quiz data to migrate")
         
         migrated_count = 0
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.attempts import reap_abandoned
+
+
+class Command(BaseCommand):
+    help = 'Closes open test submissions whose time limit ran out, graded on the answers they have'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Submissions closed per transaction')
+        parser.add_argument('--every', type=int, help='Keep sweeping, every this many seconds')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError("--every must be positive")
+        while True:
+            reaped = reap_abandoned(batch_size=options['batch_size'])
+            self.stdout.write(f"Closed {reaped} abandoned submissions")
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from courses.grading import point_totals, rebuild_scores
+from courses.models import TestSubmission
+from courses.progress import rebuild_progress
+from courses.stats import rebuild_test_stats
+
+
+class Command(BaseCommand):
+    help = 'Checks and rebuilds the denormalized point counters of test submissions, the test statistics and user progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, help='Only submissions of this test')
+        parser.add_argument('--check', action='store_true', help='Only report inconsistent submissions')
+
+    def handle(self, *args, **options):
+        submissions = TestSubmission.objects.filter(is_completed=True)
+        if options['test']:
+            submissions = submissions.filter(test_id=options['test'])
+
+        earned_points, total_points = point_totals()
+        inconsistent = submissions.annotate(
+            actual_earned=earned_points, actual_total=total_points
+        ).filter(~Q(earned_points=F('actual_earned')) | ~Q(total_points=F('actual_total')))
+        self.stdout.write(f"Found {inconsistent.count()} inconsistent submissions")
+
+        if not options['check']:
+            updated = rebuild_scores(submissions)
+            self.stdout.write(f"Rebuilt counters of {updated} submissions")
+            test_ids = sorted(submissions.values_list('test_id', flat=True).distinct())
+            rebuild_test_stats(test_ids)
+            self.stdout.write(f"Rebuilt statistics of {len(test_ids)} tests")
+            rebuild_progress(submissions)
+            self.stdout.write("Rebuilt user progress")
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from courses.models import Question, Test
+from courses.rescoring import rescore_test, rescore_unit
+from courses.stats import rebuild_test_stats
+
+
+class Command(BaseCommand):
+    help = 'Regrades stored answers with the current answer keys and rescores their submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, action='append', default=[], help='Test id (repeatable)')
+        parser.add_argument('--course', type=int, help='All tests of this course')
+        parser.add_argument('--question', type=int, action='append', default=[], help='Test of this question (repeatable)')
+        parser.add_argument('--include-open', action='store_true',
+                            help='Also rescore open-ended answers (overwrites manual reviews)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes to spread each test over')
+        parser.add_argument('--checkpoint-dir', help='Directory for resume checkpoints')
+        parser.add_argument('--restart', action='store_true', help='Ignore existing checkpoints')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.none()
+        if options['test']:
+            tests |= Test.objects.filter(pk__in=options['test'])
+        if options['course']:
+            tests |= Test.objects.filter(lesson__course_id=options['course'])
+        if options['question']:
+            tests |= Test.objects.filter(pk__in=Question.objects.filter(pk__in=options['question']).values('test_id'))
+        test_ids = sorted(tests.values_list('pk', flat=True).distinct())
+        if not test_ids:
+            raise CommandError("No tests selected; use --test, --course or --question")
+
+        slots = max(options['workers'], 1)
+        checkpoint_dir = options['checkpoint_dir']
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+        units = []
+        for test_id in test_ids:
+            for slot in range(slots):
+                checkpoint = None
+                if checkpoint_dir:
+                    checkpoint = os.path.join(checkpoint_dir, f'test-{test_id}-{slot}-of-{slots}.json')
+                    if options['restart'] and os.path.exists(checkpoint):
+                        os.remove(checkpoint)
+                units.append({
+                    'test_id': test_id,
+                    'slot': slot,
+                    'slots': slots,
+                    'include_open': options['include_open'],
+                    'chunk_size': options['chunk_size'],
+                    'checkpoint': checkpoint,
+                })
+
+        total_regraded = total_changed = 0
+        if slots == 1:
+            for unit in units:
+                regraded, changed = rescore_test(**unit, progress=self.report)
+                total_regraded += regraded
+                total_changed += changed
+        else:
+            # Forked workers must not inherit an open connection: closing it
+            # there would end the parent's database session too
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=slots, mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [pool.submit(rescore_unit, unit) for unit in units]
+                for future in as_completed(futures):
+                    test_id, slot, (regraded, changed) = future.result()
+                    self.stdout.write(f"Test {test_id} part {slot + 1}/{slots}: {regraded} answers regraded, {changed} changed")
+                    total_regraded += regraded
+                    total_changed += changed
+
+        rebuild_test_stats(test_ids)
+        self.stdout.write(f"Rescoring complete: {total_regraded} answers regraded, {total_changed} changed")
+
+    def report(self, test_id, regraded, changed):
+        self.stdout.write(f"Test {test_id}: {regraded} answers regraded, {changed} changed so far")
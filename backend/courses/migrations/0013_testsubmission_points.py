@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:13
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_points(apps, schema_editor):
+    TestSubmission = apps.get_model('courses', 'TestSubmission')
+    Answer = apps.get_model('courses', 'Answer')
+    answers = Answer.objects.filter(submission=OuterRef('pk')).order_by().values('submission')
+    TestSubmission.objects.update(
+        earned_points=Coalesce(Subquery(
+            answers.filter(is_correct=True).annotate(points=Sum('question__points')).values('points')
+        ), 0),
+        total_points=Coalesce(Subquery(
+            answers.annotate(points=Sum('question__points')).values('points')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_question_explanation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsubmission',
+            name='earned_points',
+            field=models.PositiveIntegerField(default=0, help_text='Points of the correct answers'),
+        ),
+        migrations.AddField(
+            model_name='testsubmission',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0, help_text='Points of all answered questions'),
+        ),
+        migrations.RunPython(fill_points, migrations.RunPython.noop),
+    ]
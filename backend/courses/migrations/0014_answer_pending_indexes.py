@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_testsubmission_points'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('is_correct__isnull', True)), fields=['id'], name='answer_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('is_correct__isnull', True)), fields=['question', 'id'], name='answer_pending_question_idx'),
+        ),
+    ]
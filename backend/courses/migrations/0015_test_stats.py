@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def fill_stats(apps, schema_editor):
+    Test = apps.get_model('courses', 'Test')
+    TestStats = apps.get_model('courses', 'TestStats')
+    QuestionStats = apps.get_model('courses', 'QuestionStats')
+    Answer = apps.get_model('courses', 'Answer')
+    TestSubmission = apps.get_model('courses', 'TestSubmission')
+
+    completed = Q(submissions__is_completed=True)
+    tests = Test.objects.annotate(
+        attempts=Count('submissions'),
+        completions=Count('submissions', filter=completed),
+        pass_count=Count('submissions', filter=completed & Q(submissions__score__gte=F('passing_score'))),
+        score_sum=Sum('submissions__score', filter=completed),
+    ).filter(attempts__gt=0)
+    squares = {}
+    for test_id, score in TestSubmission.objects.filter(is_completed=True, score__isnull=False).values_list('test_id', 'score'):
+        squares[test_id] = squares.get(test_id, 0) + score ** 2
+    TestStats.objects.bulk_create([
+        TestStats(
+            test_id=test.id, attempts=test.attempts, completions=test.completions, pass_count=test.pass_count,
+            score_sum=test.score_sum or 0, score_sum_squares=squares.get(test.id, 0),
+        )
+        for test in tests
+    ])
+    QuestionStats.objects.bulk_create([
+        QuestionStats(**row)
+        for row in Answer.objects.filter(submission__is_completed=True).values('question_id')
+        .annotate(test_id=F('question__test_id'), answered=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_answer_pending_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestStats',
+            fields=[
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.test')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Submissions started')),
+                ('completions', models.PositiveIntegerField(default=0, help_text='Submissions completed')),
+                ('pass_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_squares', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.question')),
+                ('answered', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='courses.test')),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_test_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstats',
+            name='discrimination',
+            field=models.FloatField(blank=True, help_text='Upper minus lower 27% correct rate', null=True),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='point_biserial',
+            field=models.FloatField(blank=True, help_text='Correlation with the rest of the score', null=True),
+        ),
+        migrations.AddField(
+            model_name='teststats',
+            name='analyzed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='teststats',
+            name='analyzed_submissions',
+            field=models.PositiveIntegerField(default=0, help_text='Submissions in the last item analysis'),
+        ),
+        migrations.AddField(
+            model_name='teststats',
+            name='cronbach_alpha',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ChoiceStats',
+            fields=[
+                ('choice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.choice')),
+                ('selected', models.PositiveIntegerField(default=0)),
+                ('selection_rate', models.FloatField(default=0, help_text="Share of the question's answers selecting it")),
+                ('question_stats', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choices', to='courses.questionstats')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-17 18:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_item_analysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Last change to the course or anything in it'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Last change to the lesson or its test'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Last change to the test or its questions'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 17:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_certificates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testsubmission',
+            index=models.Index(fields=['user', 'test', 'is_completed', 'score'], name='submission_user_test_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testsubmission',
+            index=models.Index(fields=['test', 'end_time'], name='submission_test_end_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-17 17:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_counters(apps, schema_editor):
+    AttemptCounter = apps.get_model('courses', 'AttemptCounter')
+    TestSubmission = apps.get_model('courses', 'TestSubmission')
+    AttemptCounter.objects.bulk_create([
+        AttemptCounter(**row)
+        for row in TestSubmission.objects.filter(user__isnull=False).values('user_id', 'test_id')
+        .annotate(started=Count('pk'), last_started_at=Max('start_time')).order_by()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_submission_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='attempt_cooldown',
+            field=models.PositiveIntegerField(default=0, help_text='Minutes a user waits between starting attempts'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='max_attempts',
+            field=models.PositiveIntegerField(blank=True, help_text='Attempts allowed per user, unlimited if empty', null=True),
+        ),
+        migrations.CreateModel(
+            name='AttemptCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'test'), name='unique_attempt_counter')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-17 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_attempt_limits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testsubmission',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['start_time'], name='submission_open_start_idx'),
+        ),
+    ]
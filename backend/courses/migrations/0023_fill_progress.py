@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-17 18:40
+
+from django.db import migrations
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_progress(apps, schema_editor):
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    TestSubmission = apps.get_model('courses', 'TestSubmission')
+
+    # The aggregates of progress.rebuild_progress, over every completed submission
+    rows = list(
+        TestSubmission.objects.filter(is_completed=True, user__isnull=False).values(
+            'user_id', 'test__lesson_id', 'test__lesson__course_id',
+        ).annotate(
+            attempts=Count('pk'),
+            best_score=Max('score'),
+            passed_at=Min('end_time', filter=Q(score__gte=F('test__passing_score'))),
+            last_attempt_at=Max('end_time'),
+        ).order_by()
+    )
+    CourseProgress.objects.bulk_create(
+        [CourseProgress(user_id=row['user_id'], course_id=row['test__lesson__course_id']) for row in rows],
+        ignore_conflicts=True, batch_size=2000,
+    )
+    course_progress = {
+        (user_id, course_id): pk
+        for pk, user_id, course_id in CourseProgress.objects.values_list('pk', 'user_id', 'course_id')
+    }
+    LessonProgress.objects.bulk_create(
+        [
+            LessonProgress(
+                course_progress_id=course_progress[row['user_id'], row['test__lesson__course_id']],
+                user_id=row['user_id'],
+                course_id=row['test__lesson__course_id'],
+                lesson_id=row['test__lesson_id'],
+                attempts=row['attempts'],
+                best_score=row['best_score'],
+                passed=row['passed_at'] is not None,
+                passed_at=row['passed_at'],
+                last_attempt_at=row['last_attempt_at'],
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'lesson'],
+        update_fields=['attempts', 'best_score', 'passed', 'passed_at', 'last_attempt_at'],
+        batch_size=2000,
+    )
+
+    passed = (
+        LessonProgress.objects.filter(course_progress=OuterRef('pk'), passed=True)
+        .order_by().values('course_progress').annotate(count=Count('pk')).values('count')
+    )
+    CourseProgress.objects.update(lessons_passed=Coalesce(Subquery(passed), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_submission_open_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
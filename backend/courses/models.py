@@ -1,15 +1,56 @@
 # models.py
+import base64
+import secrets
+
 from django.db import models
+from django.db.models import F, Max, Window
+from django.db.models.functions import FirstValue, Lag, Lead
 from django.conf import settings
 
 class Course(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change to the course or anything in it")
     
     def __str__(self):
         return self.name
 
+class LessonQuerySet(models.QuerySet):
+    def with_navigation(self):
+        """Annotate next_lesson_id/prev_lesson_id with LEAD/LAG over the course."""
+        window = {'partition_by': [F('course_id')], 'order_by': F('id').asc()}
+        return self.annotate(
+            next_lesson_id=Window(expression=Lead('id'), **window),
+            prev_lesson_id=Window(expression=Lag('id'), **window),
+        )
+
+    def neighbours(self, lesson):
+        """Return (prev_lesson_id, next_lesson_id) for a single lesson in one query.
+
+        The window has to see the whole course, so the lesson is picked out of
+        the course's rows here instead of being filtered on in SQL.
+        """
+        rows = (
+            self.filter(course_id=lesson.course_id)
+            .with_navigation()
+            .values_list('id', 'prev_lesson_id', 'next_lesson_id')
+        )
+        for lesson_id, prev_id, next_id in rows:
+            if lesson_id == lesson.id:
+                return prev_id, next_id
+        return None, None
+
+    def with_quiz(self):
+        """Also load the deprecated quiz column, which is deferred by default."""
+        return self.defer(None)
+
+class LessonManager(models.Manager.from_queryset(LessonQuerySet)):
+    def get_queryset(self):
+        # quiz holds whole question/choice trees that nothing reads any more,
+        # so don't select and JSON-decode it unless asked for.
+        return super().get_queryset().defer('quiz')
+
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="lessons")
     title = models.CharField(max_length=255)
@@ -18,6 +59,9 @@ class Lesson(models.Model):
     video_url = models.URLField()
     quiz = models.JSONField(default=dict, help_text="Deprecated: Use Test model instead")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change to the lesson or its test")
+
+    objects = LessonManager()
     
     def __str__(self):
         return self.title
@@ -37,7 +81,10 @@ class Test(models.Model):
     description = models.TextField(blank=True, null=True)
     passing_score = models.PositiveIntegerField(default=70, help_text="Percentage required to pass")
     time_limit = models.PositiveIntegerField(default=30, help_text="Time limit in minutes")
+    max_attempts = models.PositiveIntegerField(null=True, blank=True, help_text="Attempts allowed per user, unlimited if empty")
+    attempt_cooldown = models.PositiveIntegerField(default=0, help_text="Minutes a user waits between starting attempts")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change to the test or its questions")
     
     def __str__(self):
         return f"Test for {self.lesson.title}"
@@ -69,13 +116,63 @@ class Choice(models.Model):
     def __str__(self):
         return self.text
 
+class TestSubmissionQuerySet(models.QuerySet):
+    def with_attempt_ranks(self):
+        """Annotate each submission with the best and latest attempt of its user at its test.
+
+        Adds best_score, best_attempt_id and latest_attempt_id computed with
+        window functions over (user, test), so a whole attempt history comes
+        back from one query.
+        """
+        partition = [F('user_id'), F('test_id')]
+        return self.annotate(
+            best_score=Window(expression=Max('score'), partition_by=partition),
+            best_attempt_id=Window(
+                expression=FirstValue('id'), partition_by=partition,
+                order_by=[F('score').desc(nulls_last=True), F('end_time').asc(), F('id').asc()],
+            ),
+            latest_attempt_id=Window(
+                expression=FirstValue('id'), partition_by=partition,
+                order_by=[F('start_time').desc(), F('id').desc()],
+            ),
+        )
+
+class AttemptCounter(models.Model):
+    """The attempts a user started at a test, checked and counted in one UPDATE."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="+")
+    started = models.PositiveIntegerField(default=0)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'test'], name='unique_attempt_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s attempts at test {self.test_id}"
+
 class TestSubmission(models.Model):
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="submissions")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="test_submissions", null=True, blank=True)
     score = models.FloatField(null=True, blank=True)
+    earned_points = models.PositiveIntegerField(default=0, help_text="Points of the correct answers")
+    total_points = models.PositiveIntegerField(default=0, help_text="Points of all answered questions")
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
+
+    objects = TestSubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A user's attempts at a test, best score last within completed ones
+            models.Index(fields=['user', 'test', 'is_completed', 'score'], name='submission_user_test_idx'),
+            # Recent attempts at a test
+            models.Index(fields=['test', 'end_time'], name='submission_test_end_idx'),
+            # Open submissions oldest first, for the expiry sweep
+            models.Index(fields=['start_time'], condition=models.Q(is_completed=False), name='submission_open_start_idx'),
+        ]
     
     def __str__(self):
         username = self.user.username if self.user else "Anonymous"
@@ -88,6 +185,144 @@ class Answer(models.Model):
     text_answer = models.TextField(blank=True, null=True)
     is_correct = models.BooleanField(null=True, blank=True)
     feedback = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Review queue: keyset pagination over answers awaiting review,
+            # overall and per question (which covers filtering by test)
+            models.Index(fields=['id'], condition=models.Q(is_correct__isnull=True), name='answer_pending_idx'),
+            models.Index(
+                fields=['question', 'id'], condition=models.Q(is_correct__isnull=True),
+                name='answer_pending_question_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Answer to {self.question.text[:30]}"
+
+class TestStats(models.Model):
+    """Running totals over the completed submissions of a test."""
+    test = models.OneToOneField(Test, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    attempts = models.PositiveIntegerField(default=0, help_text="Submissions started")
+    completions = models.PositiveIntegerField(default=0, help_text="Submissions completed")
+    pass_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_squares = models.FloatField(default=0)
+    cronbach_alpha = models.FloatField(null=True, blank=True)
+    analyzed_submissions = models.PositiveIntegerField(default=0, help_text="Submissions in the last item analysis")
+    analyzed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def mean_score(self):
+        if not self.completions:
+            return None
+        return self.score_sum / self.completions
+
+    @property
+    def score_variance(self):
+        if not self.completions:
+            return None
+        # Clamp the rounding error of E[x^2] - E[x]^2 around zero
+        return max(self.score_sum_squares / self.completions - self.mean_score ** 2, 0.0)
+
+    @property
+    def pass_rate(self):
+        if not self.completions:
+            return None
+        return self.pass_count / self.completions
+
+    def __str__(self):
+        return f"Stats for test {self.test_id}"
+
+class QuestionStats(models.Model):
+    """How often a question was answered, and answered correctly."""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name="question_stats")
+    answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    discrimination = models.FloatField(null=True, blank=True, help_text="Upper minus lower 27% correct rate")
+    point_biserial = models.FloatField(null=True, blank=True, help_text="Correlation with the rest of the score")
+
+    @property
+    def correct_rate(self):
+        if not self.answered:
+            return None
+        return self.correct / self.answered
+
+    def __str__(self):
+        return f"Stats for question {self.question_id}"
+
+class ChoiceStats(models.Model):
+    """How often a choice was selected, as of the last item analysis."""
+    choice = models.OneToOneField(Choice, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    question_stats = models.ForeignKey(QuestionStats, on_delete=models.CASCADE, related_name="choices")
+    selected = models.PositiveIntegerField(default=0)
+    selection_rate = models.FloatField(default=0, help_text="Share of the question's answers selecting it")
+
+    def __str__(self):
+        return f"Stats for choice {self.choice_id}"
+
+class CourseProgress(models.Model):
+    """A user's standing in a course, kept up to date as submissions complete."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="course_progress")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="progress")
+    lessons_passed = models.PositiveIntegerField(default=0, help_text="Lessons whose test the user passed")
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_course_progress'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s progress in course {self.course_id}"
+
+class LessonProgress(models.Model):
+    """A user's attempts at the test of one lesson."""
+    course_progress = models.ForeignKey(CourseProgress, on_delete=models.CASCADE, related_name="lessons")
+    # Denormalized from course_progress, so a course's rows are one index range
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lesson_progress")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="progress")
+    attempts = models.PositiveIntegerField(default=0, help_text="Completed submissions")
+    best_score = models.FloatField(null=True, blank=True)
+    passed = models.BooleanField(default=False)
+    passed_at = models.DateTimeField(null=True, blank=True)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'lesson'], name='unique_lesson_progress'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'course', 'lesson'], name='lesson_progress_course_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s progress in lesson {self.lesson_id}"
+
+def certificate_code():
+    """A random, unambiguous code such as 7KQ4-M2XD-9FHA-TW3C."""
+    code = base64.b32encode(secrets.token_bytes(10)).decode()
+    return '-'.join(code[i:i + 4] for i in range(0, 16, 4))
+
+class Certificate(models.Model):
+    """Proof that a user completed a course, verifiable by its code."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="certificates")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="certificates")
+    code = models.CharField(max_length=19, unique=True, default=certificate_code, editable=False)
+    # Kept as issued, whatever the user or course is renamed to later
+    student_name = models.CharField(max_length=255)
+    course_name = models.CharField(max_length=255)
+    issued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_certificate'),
+        ]
+
+    def __str__(self):
+        return f"Certificate {self.code} for {self.student_name}"
@@ -0,0 +1,162 @@
+"""Upkeep of the per-user course and lesson progress.
+
+A completed submission updates its user's ``LessonProgress`` (attempts,
+best score, passed) and, the first time the lesson's test is passed, the
+``CourseProgress.lessons_passed`` counter, in a constant number of queries
+under a lock on the course progress row. Reading a user's progress in a
+course is then one index range over ``LessonProgress``.
+
+Reviews and rescoring can lower scores as well as raise them, which the
+counters can't follow incrementally, so ``rebuild_progress`` recomputes the
+progress they touched from the completed submissions.
+
+``complete_course`` counts the passed lessons that still have a test
+against the number of tests in the course, so deleted lessons and tests
+don't count, and issues the certificate once, however often it is asked.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Certificate, CourseProgress, LessonProgress, Test, TestSubmission
+
+
+class CourseNotCompleted(Exception):
+    def __init__(self, lessons_passed, lessons_required, detail="Not every test of the course has been passed yet."):
+        super().__init__(f"{lessons_passed} of {lessons_required} tests passed")
+        self.lessons_passed = lessons_passed
+        self.lessons_required = lessons_required
+        self.detail = detail
+
+
+def record_progress(submission):
+    """Count a freshly completed submission towards its user's progress."""
+    if submission.user_id is None:
+        return
+    test = submission.test
+    lesson = test.lesson
+    CourseProgress.objects.bulk_create(
+        [CourseProgress(user_id=submission.user_id, course_id=lesson.course_id)], ignore_conflicts=True,
+    )
+    # Completions of one user in one course take their turn on this row
+    course_progress = CourseProgress.objects.select_for_update().get(
+        user_id=submission.user_id, course_id=lesson.course_id,
+    )
+    lesson_progress, _ = LessonProgress.objects.get_or_create(
+        user_id=submission.user_id, lesson_id=lesson.id,
+        defaults={'course_progress': course_progress, 'course_id': lesson.course_id},
+    )
+
+    score = submission.score or 0
+    lesson_progress.attempts += 1
+    lesson_progress.last_attempt_at = submission.end_time
+    if lesson_progress.best_score is None or score > lesson_progress.best_score:
+        lesson_progress.best_score = score
+    newly_passed = score >= test.passing_score and not lesson_progress.passed
+    if newly_passed:
+        lesson_progress.passed = True
+        lesson_progress.passed_at = submission.end_time
+    lesson_progress.save(update_fields=['attempts', 'last_attempt_at', 'best_score', 'passed', 'passed_at'])
+
+    if newly_passed:
+        CourseProgress.objects.filter(pk=course_progress.pk).update(lessons_passed=F('lessons_passed') + 1)
+
+
+def rebuild_progress(submissions):
+    """Recompute the lesson and course progress behind the given submissions."""
+    pairs = set(
+        submissions.filter(user__isnull=False).values_list('user_id', 'test_id').distinct()
+    )
+    if not pairs:
+        return
+    completed = TestSubmission.objects.filter(
+        is_completed=True,
+        user_id__in={user_id for user_id, _ in pairs},
+        test_id__in={test_id for _, test_id in pairs},
+    )
+    passing = Q(score__gte=F('test__passing_score'))
+    rows = [
+        row for row in completed.values(
+            'user_id', 'test_id', 'test__lesson_id', 'test__lesson__course_id',
+        ).annotate(
+            attempts=Count('pk'),
+            best_score=Max('score'),
+            passed_at=Min('end_time', filter=passing),
+            last_attempt_at=Max('end_time'),
+        ).order_by()
+        if (row['user_id'], row['test_id']) in pairs
+    ]
+
+    CourseProgress.objects.bulk_create(
+        [CourseProgress(user_id=row['user_id'], course_id=row['test__lesson__course_id']) for row in rows],
+        ignore_conflicts=True,
+    )
+    course_progress = {
+        (progress.user_id, progress.course_id): progress.pk
+        for progress in CourseProgress.objects.filter(
+            user_id__in={row['user_id'] for row in rows},
+            course_id__in={row['test__lesson__course_id'] for row in rows},
+        )
+    }
+    LessonProgress.objects.bulk_create(
+        [
+            LessonProgress(
+                course_progress_id=course_progress[row['user_id'], row['test__lesson__course_id']],
+                user_id=row['user_id'],
+                course_id=row['test__lesson__course_id'],
+                lesson_id=row['test__lesson_id'],
+                attempts=row['attempts'],
+                best_score=row['best_score'],
+                passed=row['passed_at'] is not None,
+                passed_at=row['passed_at'],
+                last_attempt_at=row['last_attempt_at'],
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'lesson'],
+        update_fields=['attempts', 'best_score', 'passed', 'passed_at', 'last_attempt_at'],
+    )
+
+    passed = (
+        LessonProgress.objects.filter(course_progress=OuterRef('pk'), passed=True)
+        .order_by().values('course_progress').annotate(count=Count('pk')).values('count')
+    )
+    CourseProgress.objects.filter(pk__in=set(course_progress.values())).update(
+        lessons_passed=Coalesce(Subquery(passed), 0),
+    )
+
+
+@transaction.atomic
+def complete_course(user, course):
+    """Issue the user's certificate for a course once every test in it is passed.
+
+    Returns ``(certificate, created)``; asking again returns the certificate
+    issued the first time. Raises ``CourseNotCompleted`` otherwise.
+    """
+    certificate = Certificate.objects.filter(user=user, course=course).first()
+    if certificate is not None:
+        return certificate, False
+
+    required = Test.objects.filter(lesson__course=course).count()
+    if not required:
+        raise CourseNotCompleted(0, 0, "The course has no tests to pass.")
+    # Not the lessons_passed counter, which still counts deleted lessons
+    passed = LessonProgress.objects.filter(
+        user=user, course=course, passed=True, lesson__test__isnull=False,
+    ).count()
+    if passed < required:
+        raise CourseNotCompleted(passed, required)
+
+    # Concurrent requests insert at most one certificate between them
+    issued = Certificate(
+        user=user, course=course,
+        student_name=getattr(user, 'full_name', '') or user.get_username(),
+        course_name=course.name,
+    )
+    Certificate.objects.bulk_create([issued], ignore_conflicts=True)
+    CourseProgress.objects.bulk_create([CourseProgress(user=user, course=course)], ignore_conflicts=True)
+    CourseProgress.objects.filter(user=user, course=course, completed_at__isnull=True).update(completed_at=timezone.now())
+    certificate = Certificate.objects.get(user=user, course=course)
+    return certificate, certificate.code == issued.code
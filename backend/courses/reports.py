@@ -0,0 +1,121 @@
+"""Streaming exports of submissions and answers for reporting.
+
+Rows are read with ``iterator()`` (a server-side cursor where the database
+has them) and rendered line by line, so the export of any number of
+submissions runs in flat memory. Answers prefetch their selected choices
+once per chunk rather than once per answer.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Answer, Choice, TestSubmission
+
+CHUNK_SIZE = 2000
+LINES_PER_WRITE = 500
+
+SUBMISSION_COLUMNS = [
+    'submission_id', 'test_id', 'user', 'score', 'earned_points', 'total_points',
+    'start_time', 'end_time', 'is_completed',
+]
+ANSWER_COLUMNS = [
+    'answer_id', 'submission_id', 'test_id', 'user', 'question_id',
+    'selected_choice_ids', 'text_answer', 'is_correct', 'feedback',
+]
+DATASETS = {'submissions': SUBMISSION_COLUMNS, 'answers': ANSWER_COLUMNS}
+FORMATS = ['csv', 'jsonl']
+
+
+def submission_rows(test_ids=None, course_id=None):
+    submissions = TestSubmission.objects.select_related('user').only(
+        'id', 'test_id', 'user__username', 'score', 'earned_points', 'total_points',
+        'start_time', 'end_time', 'is_completed',
+    ).order_by('id')
+    if test_ids:
+        submissions = submissions.filter(test_id__in=test_ids)
+    if course_id:
+        submissions = submissions.filter(test__lesson__course_id=course_id)
+    for submission in submissions.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'submission_id': submission.id,
+            'test_id': submission.test_id,
+            'user': submission.user.username if submission.user else None,
+            'score': submission.score,
+            'earned_points': submission.earned_points,
+            'total_points': submission.total_points,
+            'start_time': submission.start_time,
+            'end_time': submission.end_time,
+            'is_completed': submission.is_completed,
+        }
+
+
+def answer_rows(test_ids=None, course_id=None):
+    answers = Answer.objects.select_related('submission__user').only(
+        'id', 'submission_id', 'submission__test_id', 'submission__user__username',
+        'question_id', 'text_answer', 'is_correct', 'feedback',
+    ).prefetch_related(
+        Prefetch('selected_choices', queryset=Choice.objects.only('id').order_by('id'))
+    ).order_by('id')
+    if test_ids:
+        answers = answers.filter(submission__test_id__in=test_ids)
+    if course_id:
+        answers = answers.filter(submission__test__lesson__course_id=course_id)
+    for answer in answers.iterator(chunk_size=CHUNK_SIZE):
+        user = answer.submission.user
+        yield {
+            'answer_id': answer.id,
+            'submission_id': answer.submission_id,
+            'test_id': answer.submission.test_id,
+            'user': user.username if user else None,
+            'question_id': answer.question_id,
+            'selected_choice_ids': [choice.id for choice in answer.selected_choices.all()],
+            'text_answer': answer.text_answer,
+            'is_correct': answer.is_correct,
+            'feedback': answer.feedback,
+        }
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    return value.isoformat()
+
+
+def render(rows, columns, output_format):
+    """Yield the rows as text, a few hundred lines per piece."""
+    if output_format == 'csv':
+        writer = csv.writer(_Echo())
+        lines = (writer.writerow([_csv_value(row[column]) for column in columns]) for row in rows)
+        header = writer.writerow(columns)
+    else:
+        lines = (json.dumps(row, default=_json_value, ensure_ascii=False) + '\n' for row in rows)
+        header = ''
+
+    piece = [header]
+    for line in lines:
+        piece.append(line)
+        if len(piece) >= LINES_PER_WRITE:
+            yield ''.join(piece)
+            piece = []
+    if piece:
+        yield ''.join(piece)
+
+
+def export(dataset, output_format, test_ids=None, course_id=None):
+    """Yield an export of ``dataset`` (submissions or answers) as csv or jsonl."""
+    rows = submission_rows if dataset == 'submissions' else answer_rows
+    return render(rows(test_ids, course_id), DATASETS[dataset], output_format)
@@ -0,0 +1,137 @@
+"""Regrading of stored answers after a test's answer key changed.
+
+Answers are streamed per test in submission order and regraded in chunks
+with the current answer key. Only answers whose outcome changed are
+written, and the submissions of a chunk are rescored from their answers,
+so running the job twice changes nothing the second time. After every
+chunk the id of the last submission done is saved to a checkpoint file,
+from which an interrupted run picks up again as long as the answer key
+is still the one it graded with. A finished run removes its checkpoint.
+"""
+import hashlib
+import json
+import os
+
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+from .answer_keys import build_answer_key
+from .grading import chunks, choices_correct, rebuild_scores
+from .models import Answer, Choice, QuestionType, TestSubmission
+from .progress import rebuild_progress
+from .scoring import score_open_answers
+
+
+def key_fingerprint(answer_key):
+    """A digest of an answer key, the same in every process."""
+    return hashlib.sha256(repr(sorted(answer_key.items())).encode()).hexdigest()
+
+
+def read_checkpoint(path, fingerprint):
+    """The last submission done by an interrupted run with the same answer key, or 0."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        state = json.load(checkpoint)
+    if state.get('answer_key') != fingerprint:
+        return 0
+    return state['last_submission_id']
+
+
+def write_checkpoint(path, fingerprint, last_submission_id):
+    if not path:
+        return
+    with open(f'{path}.tmp', 'w') as checkpoint:
+        json.dump({'last_submission_id': last_submission_id, 'answer_key': fingerprint}, checkpoint)
+    os.replace(f'{path}.tmp', path)
+
+
+def remove_checkpoint(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def regrade(answers, answer_key, include_open=False):
+    """Regrade answers in memory; return the ones whose outcome changed."""
+    changed = []
+    open_answers = []
+    for answer in answers:
+        key = answer_key[answer.question_id]
+        if key.question_type == QuestionType.MULTIPLE_CHOICE:
+            is_correct = choices_correct(key, [choice.id for choice in answer.selected_choices.all()])
+            if is_correct != answer.is_correct:
+                answer.is_correct = is_correct
+                changed.append(answer)
+        elif include_open:
+            open_answers.append((answer, key))
+
+    scores = score_open_answers([(key, answer.text_answer or '') for answer, key in open_answers])
+    for (answer, key), score in zip(open_answers, scores):
+        if (score.is_correct, score.feedback) != (answer.is_correct, answer.feedback):
+            answer.is_correct, answer.feedback = score.is_correct, score.feedback
+            changed.append(answer)
+    return changed
+
+
+def rescore_test(test_id, include_open=False, chunk_size=2000, slot=0, slots=1,
+                 checkpoint=None, progress=None):
+    """Regrade the answers of a test's completed submissions.
+
+    ``slot``/``slots`` restrict the run to submissions whose id is ``slot``
+    modulo ``slots``, so several processes can share one large test.
+    Returns ``(answers_regraded, answers_changed)``.
+    """
+    answer_key = build_answer_key(test_id)
+    fingerprint = key_fingerprint(answer_key)
+    last_done = read_checkpoint(checkpoint, fingerprint)
+    answers = (
+        Answer.objects.filter(
+            submission__test_id=test_id,
+            submission__is_completed=True,
+            submission_id__gt=last_done,
+        )
+        .only('id', 'submission_id', 'question_id', 'text_answer', 'is_correct', 'feedback')
+        .prefetch_related(Prefetch('selected_choices', queryset=Choice.objects.only('id')))
+        .order_by('submission_id', 'id')
+    )
+    if slots > 1:
+        answers = answers.alias(slot=F('submission_id') % slots).filter(slot=slot)
+
+    regraded = changed = 0
+    batch = []
+
+    def flush(last_submission_id):
+        nonlocal regraded, changed
+        updated = regrade(batch, answer_key, include_open)
+        with transaction.atomic():
+            Answer.objects.bulk_update(updated, ['is_correct', 'feedback'], batch_size=1000)
+            submission_ids = sorted({answer.submission_id for answer in batch})
+            for ids in chunks(submission_ids, 1000):
+                submissions = TestSubmission.objects.filter(pk__in=ids)
+                rebuild_scores(submissions)
+                rebuild_progress(submissions)
+        regraded += len(batch)
+        changed += len(updated)
+        batch.clear()
+        write_checkpoint(checkpoint, fingerprint, last_submission_id)
+        if progress:
+            progress(test_id, regraded, changed)
+
+    for answer in answers.iterator(chunk_size=chunk_size):
+        # Only cut between submissions, so a checkpoint never splits one
+        if len(batch) >= chunk_size and answer.submission_id != batch[-1].submission_id:
+            flush(batch[-1].submission_id)
+        batch.append(answer)
+    if batch:
+        flush(batch[-1].submission_id)
+    remove_checkpoint(checkpoint)
+    return regraded, changed
+
+
+def rescore_unit(options):
+    """Entry point for worker processes: one test, or one slot of it.
+
+    The parent closes its connections before forking, so each worker opens
+    its own instead of talking over (and closing) the parent's socket.
+    """
+    return options['test_id'], options['slot'], rescore_test(**options)
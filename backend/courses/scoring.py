@@ -0,0 +1,209 @@
+"""Scoring of open-ended answers against the model answer of their question.
+
+Answers are scored in batches: they are grouped by question and each group
+is scored with a few NumPy matrix operations instead of looping over terms
+in Python. The backend is chosen by the ``OPEN_ANSWER_SCORER`` setting.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Letters (Cyrillic, Kazakh and Latin alike) and digits
+TOKEN_RE = re.compile(r'\w+')
+# Stress marks some texts put on vowels
+ACCENTS_RE = re.compile('[\u0300\u0301]')
+TERM_SEPARATORS_RE = re.compile(r'[,.;:\n]+')
+# Shorter tokens carry little meaning and would match far too many words
+MIN_TOKEN_LENGTH = 3
+# Only consider meaningful terms
+MIN_TERM_LENGTH = 6
+
+OpenAnswerScore = namedtuple('OpenAnswerScore', ['is_correct', 'similarity', 'matched_terms', 'feedback'])
+
+UNREVIEWED = OpenAnswerScore(None, None, (), None)
+
+
+def normalize(text):
+    """Fold case, compatibility forms and stress marks so spellings compare equal."""
+    text = ACCENTS_RE.sub('', unicodedata.normalize('NFKD', text or ''))
+    return unicodedata.normalize('NFC', text).casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    """Split text into normalized word tokens."""
+    return [token for token in TOKEN_RE.findall(normalize(text)) if not token.isdigit()]
+
+
+def extract_key_terms(correct_answer):
+    """Split a model answer into key terms, each a tuple of word tokens."""
+    terms = []
+    for phrase in TERM_SEPARATORS_RE.split(normalize(correct_answer)):
+        phrase = phrase.strip()
+        if len(phrase) < MIN_TERM_LENGTH:
+            continue
+        tokens = tuple(dict.fromkeys(
+            token for token in TOKEN_RE.findall(phrase) if len(token) >= MIN_TOKEN_LENGTH
+        ))
+        if tokens:
+            terms.append(tokens)
+    return tuple(dict.fromkeys(terms))
+
+
+def idf_weights(documents):
+    """Inverse document frequencies over a corpus of token lists.
+
+    Returns ``(weights, default)``: a tuple of ``(token, weight)`` pairs and
+    the weight of tokens the corpus lacks, which count as the rarest.
+    """
+    frequencies = defaultdict(int)
+    for tokens in documents:
+        for token in set(tokens):
+            frequencies[token] += 1
+    size = len(documents)
+    weights = tuple(sorted(
+        (token, math.log((1 + size) / (1 + frequency)) + 1) for token, frequency in frequencies.items()
+    ))
+    return weights, math.log(1 + size) + 1
+
+
+class BaseScorer:
+    """Scores batches of ``(question_key, text_answer)`` pairs.
+
+    ``question_key`` is the question's entry of its test's answer key, which
+    carries the pre-extracted ``key_terms`` and ``answer_tokens``.
+    """
+    threshold = 0.3
+
+    def score_batch(self, items):
+        results = [UNREVIEWED] * len(items)
+        groups = defaultdict(list)
+        for index, (key, text) in enumerate(items):
+            if self.can_score(key) and text and text.strip():
+                groups[key].append(index)
+        for key, indexes in groups.items():
+            scores = self.score_group(key, [tokenize(items[index][1]) for index in indexes])
+            for index, score in zip(indexes, scores):
+                results[index] = score
+        return results
+
+    def can_score(self, key):
+        """Whether answers to this question can be graded automatically."""
+        return bool(key.key_terms)
+
+    def score_group(self, key, token_lists):
+        """Score tokenized answers to the same question."""
+        raise NotImplementedError
+
+
+class KeyTermScorer(BaseScorer):
+    """Share of the model answer's key terms found in the answer.
+
+    A term is found when each of its words starts some word of the answer,
+    which lets inflected (suffixed) forms of Kazakh words still match.
+    """
+
+    def score_group(self, key, token_lists):
+        vocabulary = {}
+        for term in key.key_terms:
+            for token in term:
+                vocabulary.setdefault(token, len(vocabulary))
+        longest = max(len(token) for token in vocabulary)
+
+        # term x vocabulary incidence, and how many words each term has
+        terms = np.zeros((len(key.key_terms), len(vocabulary)), dtype=np.int32)
+        for row, term in enumerate(key.key_terms):
+            terms[row, [vocabulary[token] for token in term]] = 1
+        term_sizes = terms.sum(axis=1)
+
+        # answer x vocabulary incidence: which key words each answer contains
+        rows, columns = [], []
+        prefixes = {}
+        for row, tokens in enumerate(token_lists):
+            for token in set(tokens):
+                found = prefixes.get(token)
+                if found is None:
+                    found = prefixes[token] = [
+                        vocabulary[token[:end]]
+                        for end in range(MIN_TOKEN_LENGTH, min(len(token), longest) + 1)
+                        if token[:end] in vocabulary
+                    ]
+                rows.extend([row] * len(found))
+                columns.extend(found)
+        answers = np.zeros((len(token_lists), len(vocabulary)), dtype=np.int32)
+        answers[rows, columns] = 1
+
+        matched = (answers @ terms.T) == term_sizes
+        similarities = matched.sum(axis=1) / len(key.key_terms)
+
+        total = len(key.key_terms)
+        phrases = [' '.join(term) for term in key.key_terms]
+        return [
+            OpenAnswerScore(
+                is_correct=bool(similarity >= self.threshold),
+                similarity=float(similarity),
+                matched_terms=tuple(phrases[column] for column in np.flatnonzero(row)),
+                feedback=f"Your answer matched {int(row.sum())} out of {total} key concepts.",
+            )
+            for similarity, row in zip(similarities, matched)
+        ]
+
+
+class TfidfScorer(BaseScorer):
+    """Cosine similarity between TF-IDF vectors of the answer and the model answer.
+
+    Document frequencies come from the test's questions and model answers,
+    fixed in the answer key, so words the whole test uses weigh less than
+    the distinctive ones and an answer scores the same in any batch.
+    """
+    threshold = 0.4
+
+    def can_score(self, key):
+        return bool(key.answer_tokens)
+
+    def score_group(self, key, token_lists):
+        documents = [list(key.answer_tokens)] + token_lists
+        vocabulary = {}
+        for tokens in documents:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+
+        counts = np.zeros((len(documents), len(vocabulary)), dtype=np.float64)
+        for row, tokens in enumerate(documents):
+            for token in tokens:
+                counts[row, vocabulary[token]] += 1
+
+        weights = dict(key.idf_weights)
+        idf = np.array([weights.get(token, key.idf_default) for token in vocabulary])
+        vectors = counts * idf
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1
+        vectors /= norms[:, None]
+        similarities = vectors[1:] @ vectors[0]
+
+        model_tokens = set(key.answer_tokens)
+        return [
+            OpenAnswerScore(
+                is_correct=bool(similarity >= self.threshold),
+                similarity=float(similarity),
+                matched_terms=tuple(sorted(model_tokens.intersection(tokens))),
+                feedback=f"Your answer is {math.floor(similarity * 100)}% similar to the model answer.",
+            )
+            for similarity, tokens in zip(similarities, token_lists)
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_scorer():
+    """The configured scorer instance."""
+    return import_string(settings.OPEN_ANSWER_SCORER)()
+
+
+def score_open_answers(items):
+    """Score ``(question_key, text_answer)`` pairs with the configured backend."""
+    return get_scorer().score_batch(items)
@@ -1,8 +1,53 @@
 # serializers.py
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import Course, Lesson, Test, Question, Choice, TestSubmission, Answer
+from .editing import write_question, write_questions
+from .models import (
+    Course, Lesson, Test, Question, Choice, TestSubmission, Answer, TestStats, QuestionStats, ChoiceStats,
+    LessonProgress, Certificate,
+)
+
+
+def query_param_list(request, name):
+    """Split a comma separated query parameter into a list of names."""
+    if request is None:
+        return []
+    value = request.query_params.get(name, '')
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets for read requests: ``?fields=`` and ``?omit=``.
+
+    Fields that are dropped are removed before serialization, so their
+    SerializerMethodFields are never computed. Only the serializer the view
+    builds is trimmed; nested serializers keep their own field sets.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = query_param_list(request, 'fields')
+        omitted = query_param_list(request, 'omit')
+        for name in list(self.fields):
+            if (requested and name not in requested) or name in omitted:
+                self.fields.pop(name)
+
+    def deferred_model_fields(self):
+        """Names of plain model columns that the trimmed output never reads."""
+        read = {
+            field.source.split('.')[0]
+            for field in self.fields.values()
+            if not field.write_only
+        }
+        return [
+            field.name
+            for field in self.Meta.model._meta.concrete_fields
+            if not field.primary_key and not field.is_relation and field.name not in read
+        ]
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     has_test = serializers.SerializerMethodField()
     test_id = serializers.SerializerMethodField()
     next_lesson_id = serializers.SerializerMethodField()
@@ -25,32 +70,49 @@ class LessonSerializer(serializers.ModelSerializer):
         return None
 
     def get_next_lesson_id(self, obj):
-        # Find the next lesson in the same course with a higher ID
-        next_lesson = Lesson.objects.filter(course=obj.course, id__gt=obj.id).order_by('id').first()
-        if next_lesson:
-            return next_lesson.id
-        return None
+        return self._navigation(obj)[1]
 
     def get_prev_lesson_id(self, obj):
-        # Find the previous lesson in the same course with a lower ID
-        prev_lesson = Lesson.objects.filter(course=obj.course, id__lt=obj.id).order_by('-id').first()
-        if prev_lesson:
-            return prev_lesson.id
-        return None
+        return self._navigation(obj)[0]
 
-class CourseSerializer(serializers.ModelSerializer):
+    def _navigation(self, obj):
+        # List querysets annotate neighbours with LEAD/LAG; a lone lesson
+        # (retrieve, create, update) looks them up once and keeps them.
+        if not hasattr(obj, 'next_lesson_id'):
+            obj.prev_lesson_id, obj.next_lesson_id = Lesson.objects.neighbours(obj)
+        return obj.prev_lesson_id, obj.next_lesson_id
+
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
 
     class Meta:
         model = Course
         fields = '__all__'
 
+class LessonStubSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title']
+
+class CourseListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Catalogue representation of a course: metadata and lesson stubs only."""
+    lesson_count = serializers.IntegerField(read_only=True)
+    lessons = LessonStubSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'name', 'description', 'created_at', 'lesson_count', 'lessons']
+
 class ChoiceSerializer(serializers.ModelSerializer):
+    # Writable so nested saves can match choices to the stored ones
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Choice
         fields = ['id', 'text', 'is_correct']
 
 class QuestionSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
     choices = ChoiceSerializer(many=True, read_only=False, required=False)
 
     class Meta:
@@ -58,40 +120,40 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'question_type', 'points', 'order', 'choices', 'correct_answer', 'explanation']
 
     def create(self, validated_data):
+        validated_data.pop('id', None)
         choices_data = validated_data.pop('choices', [])
         question = Question.objects.create(**validated_data)
-        
-        for choice_data in choices_data:
-            Choice.objects.create(question=question, **choice_data)
-        
-        return question
+        return write_question(question, choices_data)
 
     def update(self, instance, validated_data):
-        choices_data = validated_data.pop('choices', [])
+        validated_data.pop('id', None)
+        choices_data = validated_data.pop('choices', None)
         instance = super().update(instance, validated_data)
-        
-        # Handle existing choices - delete, update or create
-        if choices_data:
-            instance.choices.all().delete()  # Remove existing choices
-            for choice_data in choices_data:
-                Choice.objects.create(question=instance, **choice_data)
-        
-        return instance
+        return write_question(instance, choices_data)
 
-class TestSerializer(serializers.ModelSerializer):
+class TestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
 
     class Meta:
         model = Test
         fields = ['id', 'lesson', 'title', 'description', 'passing_score', 
-                  'time_limit', 'created_at', 'questions']
+                  'time_limit', 'max_attempts', 'attempt_cooldown', 'created_at', 'updated_at', 'questions']
 
 class AnswerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Answer
         fields = ['id', 'question', 'selected_choices', 'text_answer', 'is_correct', 'feedback']
 
-class TestSubmissionSerializer(serializers.ModelSerializer):
+class PendingAnswerSerializer(serializers.ModelSerializer):
+    question_text = serializers.CharField(source='question.text', read_only=True)
+    test = serializers.IntegerField(source='question.test_id', read_only=True)
+    user = serializers.CharField(source='submission.user', read_only=True)
+
+    class Meta:
+        model = Answer
+        fields = ['id', 'submission', 'test', 'user', 'question', 'question_text', 'text_answer']
+
+class TestSubmissionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     answers = AnswerSerializer(many=True, read_only=True)
     
     class Meta:
@@ -102,39 +164,79 @@ class TestSubmissionSerializer(serializers.ModelSerializer):
             'user': {'required': False}
         }
 
+class AttemptSerializer(serializers.ModelSerializer):
+    """A submission annotated by ``TestSubmissionQuerySet.with_attempt_ranks``."""
+    is_best = serializers.SerializerMethodField()
+    is_latest = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TestSubmission
+        fields = ['id', 'score', 'start_time', 'end_time', 'is_completed', 'is_best', 'is_latest']
+
+    def get_is_best(self, obj):
+        return obj.score is not None and obj.id == obj.best_attempt_id
+
+    def get_is_latest(self, obj):
+        return obj.id == obj.latest_attempt_id
+
+class ChoiceStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChoiceStats
+        fields = ['choice', 'selected', 'selection_rate']
+
+class QuestionStatsSerializer(serializers.ModelSerializer):
+    correct_rate = serializers.FloatField(read_only=True)
+    choices = ChoiceStatsSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = QuestionStats
+        fields = ['question', 'answered', 'correct', 'correct_rate',
+                  'discrimination', 'point_biserial', 'choices']
+
+class TestStatsSerializer(serializers.ModelSerializer):
+    mean_score = serializers.FloatField(read_only=True)
+    score_variance = serializers.FloatField(read_only=True)
+    pass_rate = serializers.FloatField(read_only=True)
+    questions = QuestionStatsSerializer(source='test.question_stats', many=True, read_only=True)
+
+    class Meta:
+        model = TestStats
+        fields = ['test', 'attempts', 'completions', 'pass_count', 'pass_rate',
+                  'mean_score', 'score_variance', 'cronbach_alpha', 'analyzed_submissions',
+                  'analyzed_at', 'updated_at', 'questions']
+
+class LessonProgressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonProgress
+        fields = ['lesson', 'attempts', 'best_score', 'passed', 'passed_at', 'last_attempt_at']
+
+class CertificateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Certificate
+        fields = ['code', 'course', 'course_name', 'student_name', 'issued_at']
+
 class TestWithQuestionsSerializer(TestSerializer):
     questions = QuestionSerializer(many=True, read_only=False)
     
     def create(self, validated_data):
         questions_data = validated_data.pop('questions', [])
         test = Test.objects.create(**validated_data)
-        
-        for question_data in questions_data:
-            choices_data = question_data.pop('choices', [])
-            question = Question.objects.create(test=test, **question_data)
-            
-            for choice_data in choices_data:
-                Choice.objects.create(question=question, **choice_data)
-        
-        return test
+        return write_questions(test, questions_data)
 
     def update(self, instance, validated_data):
-        questions_data = validated_data.pop('questions', [])
+        # Questions left out of a partial update are kept as they are
+        questions_data = validated_data.pop('questions', None)
         instance = super().update(instance, validated_data)
-        
-        # Handle existing questions
         if questions_data is not None:
-            instance.questions.all().delete()  # Remove existing questions
-            
-            for question_data in questions_data:
-                choices_data = question_data.pop('choices', [])
-                question = Question.objects.create(test=instance, **question_data)
-                
-                for choice_data in choices_data:
-                    Choice.objects.create(question=question, **choice_data)
-        
+            write_questions(instance, questions_data)
         return instance
 
+    def to_representation(self, instance):
+        # The view drops prefetched relations after a save, so load the
+        # written question tree in two queries rather than one per question
+        prefetch_related_objects([instance], 'questions__choices')
+        return super().to_representation(instance)
+
 class SubmitAnswerSerializer(serializers.Serializer):
     question_id = serializers.IntegerField()
     selected_choice_ids = serializers.ListField(
@@ -142,16 +244,8 @@ class SubmitAnswerSerializer(serializers.Serializer):
         required=False
     )
     text_answer = serializers.CharField(required=False, allow_blank=True)
-    
-    def validate(self, data):
-        question_id = data.get('question_id')
-        question = Question.objects.get(id=question_id)
-        
-        if question.question_type == 'MCQ' and not data.get('selected_choice_ids'):
-            raise serializers.ValidationError("Multiple choice questions require selected choices")
-            
-        if question.question_type == 'OPEN' and not data.get('text_answer'):
-            raise serializers.ValidationError("Open ended questions require a text answer")
-            
-        return data
 
+class ReviewAnswerSerializer(serializers.Serializer):
+    answer_id = serializers.IntegerField()
+    is_correct = serializers.BooleanField(allow_null=True)
+    feedback = serializers.CharField(required=False, allow_blank=True, default='')
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .answer_keys import invalidate_answer_key
+from .content_cache import invalidate_courses, touch, touch_test
+from .models import Choice, Course, Lesson, Question, Test
+
+_muted = ContextVar('content_receivers_muted', default=False)
+
+
+@contextmanager
+def question_receivers_muted():
+    """Skip the per-row question and choice receivers, for writers that invalidate once themselves."""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def _cascaded(instance, origin):
+    """Whether a deletion came from deleting a parent, whose own receiver records the change."""
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not type(instance)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_courses([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded(instance, origin):
+        return
+    touch([instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=Test)
+def test_changed(sender, instance, origin=None, **kwargs):
+    invalidate_answer_key(instance.id)
+    if _cascaded(instance, origin):
+        return
+    touch(Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True), lesson_ids=[instance.lesson_id])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, origin=None, **kwargs):
+    if _muted.get() or _cascaded(instance, origin):
+        return
+    invalidate_answer_key(instance.test_id)
+    touch_test(instance.test_id)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, origin=None, **kwargs):
+    if _muted.get() or _cascaded(instance, origin):
+        return
+    owner = Question.objects.filter(pk=instance.question_id).values_list('test_id', 'test__lesson__course_id').first()
+    if owner is not None:
+        invalidate_answer_key(owner[0])
+        touch([owner[1]], test_ids=[owner[0]])
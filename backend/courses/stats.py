@@ -0,0 +1,94 @@
+"""Incremental upkeep of the per-test and per-question statistics.
+
+Every event adjusts the counters with F() expressions in a constant number
+of queries, so reading the statistics never has to scan submissions or
+answers. ``rebuild_test_stats`` recomputes them from scratch for the bulk
+paths (bulk reviews, rescoring) and for repairs.
+"""
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+
+from .models import Answer, QuestionStats, TestStats, TestSubmission
+
+
+def _increment(model, pk, create_defaults, **changes):
+    """Apply F() increments to a stats row, creating the row on first use."""
+    updates = {field: F(field) + value for field, value in changes.items()}
+    if not model.objects.filter(pk=pk).update(**updates):
+        model.objects.bulk_create([model(pk=pk, **create_defaults)], ignore_conflicts=True)
+        model.objects.filter(pk=pk).update(**updates)
+
+
+def record_attempt(test_id):
+    _increment(TestStats, test_id, {}, attempts=1)
+
+
+def record_completion(submission, answers):
+    """Count a freshly graded submission and its answers."""
+    score = submission.score or 0
+    _increment(
+        TestStats, submission.test_id, {},
+        completions=1,
+        pass_count=int(score >= submission.test.passing_score),
+        score_sum=score,
+        score_sum_squares=score ** 2,
+    )
+
+    question_ids = {answer.question_id for answer in answers}
+    if not question_ids:
+        return
+    correct_ids = {answer.question_id for answer in answers if answer.is_correct}
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=question_id, test_id=submission.test_id) for question_id in question_ids],
+        ignore_conflicts=True,
+    )
+    QuestionStats.objects.filter(question_id__in=question_ids).update(
+        answered=F('answered') + 1,
+        correct=F('correct') + Case(When(question_id__in=correct_ids, then=1), default=0, output_field=IntegerField()),
+    )
+
+
+def record_review(submission, question_id, correct_delta, old_score, new_score):
+    """Adjust the statistics after a review flipped one answer of a completed submission."""
+    passing_score = submission.test.passing_score
+    old_score, new_score = old_score or 0, new_score or 0
+    _increment(
+        TestStats, submission.test_id, {},
+        pass_count=int(new_score >= passing_score) - int(old_score >= passing_score),
+        score_sum=new_score - old_score,
+        score_sum_squares=new_score ** 2 - old_score ** 2,
+    )
+    _increment(QuestionStats, question_id, {'test_id': submission.test_id}, correct=correct_delta)
+
+
+def rebuild_test_stats(test_ids):
+    """Recompute the statistics of the given tests from their submissions."""
+    for test_id in test_ids:
+        submissions = TestSubmission.objects.filter(test_id=test_id)
+        completed = submissions.filter(is_completed=True)
+        totals = completed.aggregate(
+            completions=Count('pk'),
+            pass_count=Count('pk', filter=Q(score__gte=F('test__passing_score'))),
+            score_sum=Sum('score'),
+        )
+        score_sum_squares = sum(score ** 2 for score in completed.values_list('score', flat=True) if score)
+        TestStats.objects.update_or_create(test_id=test_id, defaults={
+            'attempts': submissions.count(),
+            'completions': totals['completions'],
+            'pass_count': totals['pass_count'],
+            'score_sum': totals['score_sum'] or 0,
+            'score_sum_squares': score_sum_squares,
+        })
+
+        per_question = (
+            Answer.objects.filter(submission__test_id=test_id, submission__is_completed=True)
+            .values('question_id')
+            .annotate(answered=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+        )
+        # Upsert rather than recreate, keeping the item analysis columns
+        rows = [QuestionStats(test_id=test_id, **row) for row in per_question]
+        QuestionStats.objects.filter(test_id=test_id).exclude(
+            question_id__in=[row.question_id for row in rows]
+        ).update(answered=0, correct=0)
+        QuestionStats.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['question'], update_fields=['answered', 'correct'],
+        )
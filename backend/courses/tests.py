@@ -1,3 +1,1384 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.core.cache import caches
+from django.test import TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import answer_keys, compression, rescoring, scoring
+from .answer_keys import QuestionKey
+from .attempts import reap_abandoned
+from .models import (
+    Answer, AttemptCounter, Certificate, Choice, Course, CourseProgress, Lesson, LessonProgress, Question, QuestionType, Test, TestStats,
+    TestSubmission,
+)
+from .item_analysis import analyze_test
+from .stats import rebuild_test_stats
+
+
+class TestCase(DjangoTestCase):
+    """A TestCase starting from empty caches.
+
+    Rolled back rows free their ids for the next test, and cache bumps wait
+    for a commit that never comes, so entries would otherwise carry over.
+    """
+    def _pre_setup(self):
+        super()._pre_setup()
+        for cache in caches.all():
+            cache.clear()
+        answer_keys._lru.clear()
+
+
+def make_course(lesson_count, with_tests=True):
+    course = Course.objects.create(name="Course", description="Description")
+    for i in range(lesson_count):
+        lesson = Lesson.objects.create(
+            course=course, title=f"Lesson {i}", video_url="https://example.com/video"
+        )
+        if with_tests and i % 2 == 0:
+            Test.objects.create(lesson=lesson, title=f"Test {i}")
+    return course
+
+
+def make_test(question_count, open_every=0):
+    """A test whose first choice of every multiple choice question is correct."""
+    lesson = make_course(1, with_tests=False).lessons.get()
+    test = Test.objects.create(lesson=lesson, title="Test")
+    for i in range(question_count):
+        if open_every and i % open_every == 0:
+            Question.objects.create(
+                test=test, text=f"Open {i}", question_type=QuestionType.OPEN_ENDED,
+                correct_answer="rasterization, antialiasing", order=i,
+            )
+            continue
+        question = Question.objects.create(test=test, text=f"Question {i}", order=i)
+        for j in range(4):
+            Choice.objects.create(question=question, text=f"Choice {j}", is_correct=j == 0)
+    return test
+
+
+def answers_for(test, correct=True):
+    answers = []
+    for question in test.questions.prefetch_related('choices'):
+        if question.question_type == QuestionType.OPEN_ENDED:
+            text = "Rasterization and antialiasing" if correct else "No idea"
+            answers.append({'question_id': question.id, 'text_answer': text})
+            continue
+        choices = [choice for choice in question.choices.all() if choice.is_correct == correct]
+        answers.append({'question_id': question.id, 'selected_choice_ids': [choices[0].id]})
+    return answers
+
+
+class CourseDetailQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_query_count_does_not_grow_with_lessons(self):
+        small = make_course(2)
+        large = make_course(40)
+
+        small_queries, _ = self.count_queries(f"/api/courses/courses/{small.id}/")
+        large_queries, _ = self.count_queries(f"/api/courses/courses/{large.id}/")
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertLessEqual(large_queries, 3)
+
+    def test_lesson_graph_includes_neighbours_and_tests(self):
+        course = make_course(3)
+        lessons = list(course.lessons.order_by('id'))
+
+        _, data = self.count_queries(f"/api/courses/courses/{course.id}/")
+
+        payload = data['lessons']
+        self.assertEqual([lesson['id'] for lesson in payload], [lesson.id for lesson in lessons])
+        self.assertIsNone(payload[0]['prev_lesson_id'])
+        self.assertEqual(payload[0]['next_lesson_id'], lessons[1].id)
+        self.assertEqual(payload[1]['prev_lesson_id'], lessons[0].id)
+        self.assertIsNone(payload[2]['next_lesson_id'])
+        self.assertTrue(payload[0]['has_test'])
+        self.assertEqual(payload[0]['test_id'], lessons[0].test.id)
+        self.assertFalse(payload[1]['has_test'])
+        self.assertIsNone(payload[1]['test_id'])
+
+
+class LessonNavigationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = make_course(3)
+        self.lessons = list(self.course.lessons.order_by('id'))
+        # Lessons of another course must not leak into the navigation
+        make_course(2)
+
+    def test_retrieve_uses_one_navigation_query(self):
+        middle = self.lessons[1]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/courses/lessons/{middle.id}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['prev_lesson_id'], self.lessons[0].id)
+        self.assertEqual(response.data['next_lesson_id'], self.lessons[2].id)
+        # Course id, lesson, navigation and the ETag version check
+        self.assertEqual(len(queries), 4)
+
+    def test_lessons_by_course_are_annotated(self):
+        url = f"/api/courses/courses/{self.course.id}/lessons/list/"
+        user = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        # The lessons and the ETag version check
+        self.assertEqual(len(queries), 2)
+        navigation = [(lesson['prev_lesson_id'], lesson['next_lesson_id']) for lesson in response.data]
+        ids = [lesson.id for lesson in self.lessons]
+        self.assertEqual(navigation, [(None, ids[1]), (ids[0], ids[2]), (ids[1], None)])
+
+
+class CourseCatalogueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = make_course(3)
+        self.course.lessons.update(description="<style>" + "x" * 5000 + "</style>")
+
+    def test_list_returns_lesson_stubs(self):
+        response = self.client.get("/api/courses/courses/")
+
+        self.assertEqual(response.status_code, 200)
+        course = response.data[0]
+        self.assertEqual(course['lesson_count'], 3)
+        self.assertEqual(set(course['lessons'][0]), {'id', 'title'})
+        self.assertLess(len(response.content), 1000)
+
+    def test_expand_lessons_restores_nested_payload(self):
+        response = self.client.get("/api/courses/courses/?expand=lessons")
+
+        lesson = response.data[0]['lessons'][0]
+        self.assertIn('description', lesson)
+        self.assertIn('next_lesson_id', lesson)
+
+    def test_fields_limits_top_level_fields(self):
+        response = self.client.get("/api/courses/courses/?fields=id,name")
+
+        self.assertEqual(set(response.data[0]), {'id', 'name'})
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.lesson = make_course(1).lessons.get()
+
+    def test_omit_drops_fields_and_defers_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/courses/lessons/{self.lesson.id}/?omit=description,next_lesson_id,prev_lesson_id")
+
+        self.assertNotIn('description', response.data)
+        self.assertNotIn('next_lesson_id', response.data)
+        self.assertIn('title', response.data)
+        # No navigation lookup, and the description column is never selected
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('"courses_lesson"."description"' in query['sql'] for query in queries))
+
+    def test_fields_selects_subset(self):
+        response = self.client.get(f"/api/courses/lessons/{self.lesson.id}/?fields=id,title,has_test")
+
+        self.assertEqual(set(response.data), {'id', 'title', 'has_test'})
+
+
+class LessonQuizDeferralTests(TestCase):
+    def test_quiz_is_deferred_unless_requested(self):
+        lesson = make_course(1, with_tests=False).lessons.get()
+
+        self.assertIn('quiz', Lesson.objects.get(pk=lesson.pk).get_deferred_fields())
+        self.assertNotIn('quiz', Lesson.objects.with_quiz().get(pk=lesson.pk).get_deferred_fields())
+
+
+class SubmitTestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def submit(self, test, answers):
+        submission = TestSubmission.objects.create(test=test)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers}, format='json'
+            )
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_answers(self):
+        small = make_test(2, open_every=2)
+        large = make_test(50, open_every=5)
+
+        _, small_queries = self.submit(small, answers_for(small))
+        response, large_queries = self.submit(large, answers_for(large))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(Answer.objects.filter(submission_id=response.data['id']).count(), 50)
+
+    def test_grades_answers(self):
+        test = make_test(4, open_every=2)
+        answers = answers_for(test)
+        wrong = answers_for(test, correct=False)
+        answers[1] = wrong[1]
+
+        response, _ = self.submit(test, answers)
+
+        self.assertEqual(response.data['score'], 75)
+        self.assertTrue(response.data['passed'])
+        graded = Answer.objects.filter(submission_id=response.data['id']).order_by('question__order')
+        self.assertEqual([answer.is_correct for answer in graded], [True, False, True, True])
+        self.assertEqual(graded[1].selected_choices.get().id, wrong[1]['selected_choice_ids'][0])
+
+    def test_warm_answer_key_needs_no_correctness_queries(self):
+        test = make_test(10, open_every=3)
+        answers = answers_for(test)
+        self.submit(test, answers)
+
+        submission = TestSubmission.objects.create(test=test)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers}, format='json')
+
+        tables = " ".join(query['sql'] for query in queries)
+        self.assertNotIn('FROM "courses_question"', tables)
+        self.assertNotIn('FROM "courses_choice"', tables)
+
+    def test_answer_key_follows_choice_edits(self):
+        test = make_test(1)
+        answers = answers_for(test)
+        response, _ = self.submit(test, answers)
+        self.assertEqual(response.data['score'], 100)
+
+        question = test.questions.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            for choice in question.choices.all():
+                choice.is_correct = not choice.is_correct
+                choice.save()
+            # Until the edit commits, grading keeps the committed key
+            response, _ = self.submit(test, answers)
+            self.assertEqual(response.data['score'], 100)
+
+        response, _ = self.submit(test, answers)
+        self.assertEqual(response.data['score'], 0)
+
+    def test_unknown_question_is_rejected(self):
+        test = make_test(1)
+
+        response, _ = self.submit(test, [{'question_id': 0, 'selected_choice_ids': [1]}])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Answer.objects.exists())
+
+
+class ReviewOpenAnswerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.test = make_test(4, open_every=2)
+        answers = answers_for(self.test)
+        for answer in answers:
+            if 'text_answer' in answer:
+                answer['text_answer'] = "Something else entirely"
+        self.submission = TestSubmission.objects.create(test=self.test, user=self.staff)
+        self.client.post(f"/api/courses/test-submissions/{self.submission.id}/submit/", {'answers': answers}, format='json')
+        self.open_answer = Answer.objects.filter(
+            submission=self.submission, question__question_type=QuestionType.OPEN_ENDED
+        ).first()
+
+    def review(self, is_correct):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f"/api/courses/answers/{self.open_answer.id}/review/", {'is_correct': is_correct}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.submission.refresh_from_db()
+        return len(queries)
+
+    def test_review_updates_counters_incrementally(self):
+        self.submission.refresh_from_db()
+        self.assertEqual((self.submission.earned_points, self.submission.total_points), (2, 4))
+
+        self.review(True)
+        self.assertEqual(self.submission.earned_points, 3)
+        self.assertEqual(self.submission.score, 75)
+
+        # Reviewing the same outcome again changes nothing
+        self.review(True)
+        self.assertEqual(self.submission.earned_points, 3)
+
+        self.review(False)
+        self.assertEqual(self.submission.earned_points, 2)
+        self.assertEqual(self.submission.score, 50)
+
+    def test_review_query_count_does_not_depend_on_test_size(self):
+        small_queries = self.review(True)
+
+        self.submit_large_test()
+        self.assertEqual(self.review(True), small_queries)
+
+    def submit_large_test(self):
+        self.test = make_test(40, open_every=2)
+        self.submission = TestSubmission.objects.create(test=self.test, user=self.staff)
+        self.client.post(
+            f"/api/courses/test-submissions/{self.submission.id}/submit/", {'answers': answers_for(self.test, correct=False)}, format='json'
+        )
+        self.open_answer = Answer.objects.filter(
+            submission=self.submission, question__question_type=QuestionType.OPEN_ENDED
+        ).first()
+
+    def test_rebuild_command_restores_counters(self):
+        TestSubmission.objects.filter(pk=self.submission.pk).update(earned_points=0, total_points=0, score=0)
+        out = StringIO()
+
+        call_command('rebuild_submission_scores', stdout=out)
+
+        self.submission.refresh_from_db()
+        self.assertIn("Found 1 inconsistent submissions", out.getvalue())
+        self.assertEqual((self.submission.earned_points, self.submission.total_points), (2, 4))
+        self.assertEqual(self.submission.score, 50)
+
+
+class BulkReviewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.test = make_test(4, open_every=2)
+        answers = [
+            {**answer, 'text_answer': "Something else"} if 'text_answer' in answer else answer
+            for answer in answers_for(self.test)
+        ]
+        self.submissions = []
+        for _ in range(3):
+            submission = TestSubmission.objects.create(test=self.test, user=self.staff)
+            self.client.post(f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers}, format='json')
+            self.submissions.append(submission)
+        self.open_answers = list(Answer.objects.filter(question__question_type=QuestionType.OPEN_ENDED))
+
+    def test_bulk_review_rescores_each_submission_once(self):
+        reviews = [{'answer_id': answer.id, 'is_correct': True, 'feedback': "Good"} for answer in self.open_answers]
+
+        response = self.client.post("/api/courses/answers/review/bulk/", reviews, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'reviewed': 6, 'submissions_rescored': 3})
+        for submission in self.submissions:
+            submission.refresh_from_db()
+            self.assertEqual(submission.earned_points, 4)
+            self.assertEqual(submission.score, 100)
+        self.assertEqual(Answer.objects.filter(feedback="Good").count(), 6)
+
+    def test_unknown_answers_are_rejected(self):
+        mcq_answer = Answer.objects.filter(question__question_type=QuestionType.MULTIPLE_CHOICE).first()
+        reviews = [
+            {'answer_id': self.open_answers[0].id, 'is_correct': True},
+            {'answer_id': mcq_answer.id, 'is_correct': True},
+        ]
+
+        response = self.client.post("/api/courses/answers/review/bulk/", reviews, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['answer_ids'], [str(mcq_answer.id)])
+        self.open_answers[0].refresh_from_db()
+        self.assertFalse(self.open_answers[0].is_correct)
+
+    def test_requires_staff(self):
+        student = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=student)
+
+        response = self.client.post("/api/courses/answers/review/bulk/", [], format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class PendingAnswersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+        self.tests = [make_test(3, open_every=1) for _ in range(2)]
+        for test in self.tests:
+            for question in test.questions.all():
+                question.correct_answer = None
+                question.save()
+            submission = TestSubmission.objects.create(test=test, user=staff)
+            self.client.post(
+                f"/api/courses/test-submissions/{submission.id}/submit/",
+                {'answers': answers_for(test)}, format='json',
+            )
+
+    def test_pages_through_pending_answers(self):
+        pending = list(Answer.objects.filter(is_correct__isnull=True).order_by('id').values_list('id', flat=True))
+        self.assertEqual(len(pending), 6)
+
+        response = self.client.get("/api/courses/answers/pending/?page_size=4")
+        first_page = [answer['id'] for answer in response.data['results']]
+        response = self.client.get(response.data['next'])
+        second_page = [answer['id'] for answer in response.data['results']]
+
+        self.assertEqual(first_page + second_page, pending)
+        self.assertIsNone(response.data['next'])
+
+    def test_filters_by_test_and_skips_reviewed(self):
+        test = self.tests[0]
+        reviewed = Answer.objects.filter(question__test=test).order_by('id').first()
+        reviewed.is_correct = True
+        reviewed.save()
+
+        response = self.client.get(f"/api/courses/answers/pending/?test={test.id}")
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(all(answer['test'] == test.id for answer in response.data['results']))
+        self.assertEqual(response.data['results'][0]['user'], "teacher")
+
+    def test_rejects_malformed_filters(self):
+        response = self.client.get("/api/courses/answers/pending/?test=abc")
+
+        self.assertEqual(response.status_code, 400)
+
+
+class OpenAnswerScoringTests(TestCase):
+    def question_key(self, correct_answer):
+        return QuestionKey(
+            question_type=QuestionType.OPEN_ENDED, points=1, choice_ids=frozenset(), correct_choice_ids=frozenset(),
+            key_terms=scoring.extract_key_terms(correct_answer),
+            answer_tokens=tuple(scoring.tokenize(correct_answer)),
+        )
+
+    def test_key_terms_match_inflected_forms(self):
+        key = self.question_key("Растрлық графика, пиксельдер торы, векторлық графика")
+
+        score, = scoring.KeyTermScorer().score_batch([(key, "РАСТРЛЫҚ графиканың негізі – пиксельдердің торы")])
+
+        self.assertTrue(score.is_correct)
+        self.assertEqual(score.matched_terms, ("растрлық графика", "пиксельдер торы"))
+        self.assertEqual(score.feedback, "Your answer matched 2 out of 3 key concepts.")
+
+    def test_batch_scores_answers_of_several_questions(self):
+        first = self.question_key("rasterization, antialiasing")
+        second = self.question_key("homogeneous coordinates")
+
+        scores = scoring.KeyTermScorer().score_batch([
+            (first, "Antialiasing smooths edges"),
+            (second, "Matrices"),
+            (first, ""),
+            (self.question_key(""), "Anything"),
+        ])
+
+        self.assertEqual([score.is_correct for score in scores], [True, False, None, None])
+        self.assertEqual(scores[0].similarity, 0.5)
+
+    def test_tfidf_scorer_ranks_closer_answers_higher(self):
+        key = self.question_key("Bezier curves are defined by control points")
+
+        close, far = scoring.TfidfScorer().score_batch([
+            (key, "Bezier curves use control points"),
+            (key, "Colors are mixed additively"),
+        ])
+
+        self.assertGreater(close.similarity, far.similarity)
+        self.assertTrue(close.is_correct)
+        self.assertFalse(far.is_correct)
+
+    def test_tfidf_score_does_not_depend_on_the_batch(self):
+        corpus = ["Bezier curves are defined by control points", "Colors are mixed additively on screens"]
+        weights, default = scoring.idf_weights([scoring.tokenize(text) for text in corpus])
+        key = self.question_key(corpus[0])._replace(idf_weights=weights, idf_default=default)
+        answer = "Bezier curves bend towards their control points"
+
+        alone, = scoring.TfidfScorer().score_batch([(key, answer)])
+        batch = scoring.TfidfScorer().score_batch(
+            [(key, f"Curves number {i} are smooth") for i in range(200)] + [(key, answer)]
+        )
+
+        self.assertEqual(batch[-1], alone)
+
+
+class RescoreSubmissionsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.test = make_test(4)
+        self.submissions = []
+        for _ in range(3):
+            submission = TestSubmission.objects.create(test=self.test)
+            self.client.post(
+                f"/api/courses/test-submissions/{submission.id}/submit/",
+                {'answers': answers_for(self.test)}, format='json',
+            )
+            self.submissions.append(submission)
+
+    def rescore(self, *args):
+        out = StringIO()
+        call_command('rescore_submissions', '--test', str(self.test.id), '--chunk-size', '4', *args, stdout=out)
+        return out.getvalue()
+
+    def test_regrades_after_key_change_and_is_idempotent(self):
+        question = self.test.questions.first()
+        question.choices.update(is_correct=False)
+        question.choices.exclude(pk=question.choices.order_by('id').first().pk).update(is_correct=True)
+
+        self.assertIn("12 answers regraded, 3 changed", self.rescore())
+        for submission in self.submissions:
+            submission.refresh_from_db()
+            self.assertEqual(submission.earned_points, 3)
+            self.assertEqual(submission.score, 75)
+
+        self.assertIn("12 answers regraded, 0 changed", self.rescore())
+
+    def test_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint = os.path.join(checkpoint_dir, f'test-{self.test.id}-0-of-1.json')
+            fingerprint = rescoring.key_fingerprint(answer_keys.build_answer_key(self.test.id))
+            rescoring.write_checkpoint(checkpoint, fingerprint, self.submissions[0].id)
+
+            self.assertIn("8 answers regraded", self.rescore('--checkpoint-dir', checkpoint_dir))
+            # A finished run leaves nothing to resume from
+            self.assertFalse(os.path.exists(checkpoint))
+            self.assertIn("12 answers regraded", self.rescore('--checkpoint-dir', checkpoint_dir))
+
+    def test_checkpoint_of_another_answer_key_is_ignored(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint = os.path.join(checkpoint_dir, f'test-{self.test.id}-0-of-1.json')
+            rescoring.write_checkpoint(checkpoint, 'an older key', self.submissions[0].id)
+
+            self.assertIn("12 answers regraded", self.rescore('--checkpoint-dir', checkpoint_dir))
+
+    def test_workers_share_a_test(self):
+        output = self.rescore('--workers', '2')
+
+        self.assertIn("Rescoring complete: 12 answers regraded", output)
+
+
+class TestStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.test = make_test(4, open_every=2)
+
+    def start(self):
+        response = self.client.post(f"/api/courses/tests/{self.test.id}/start/", {'test': self.test.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def submit(self, submission_id, correct):
+        self.client.post(
+            f"/api/courses/test-submissions/{submission_id}/submit/",
+            {'answers': answers_for(self.test, correct=correct)}, format='json',
+        )
+
+    def stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/courses/tests/{self.test.id}/stats/")
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_stats_follow_submissions_and_reviews(self):
+        passed, failed = self.start(), self.start()
+        self.start()
+        self.submit(passed, correct=True)
+        self.submit(failed, correct=False)
+
+        data, _ = self.stats()
+        self.assertEqual((data['attempts'], data['completions'], data['pass_count']), (3, 2, 1))
+        self.assertEqual(data['mean_score'], 50)
+        self.assertEqual(data['score_variance'], 2500)
+        self.assertEqual([question['correct_rate'] for question in data['questions']], [0.5] * 4)
+
+        open_answer = Answer.objects.filter(submission_id=failed, question__question_type=QuestionType.OPEN_ENDED).first()
+        self.client.patch(f"/api/courses/answers/{open_answer.id}/review/", {'is_correct': True}, format='json')
+
+        data, _ = self.stats()
+        self.assertEqual(data['mean_score'], 62.5)
+        reviewed = next(question for question in data['questions'] if question['question'] == open_answer.question_id)
+        self.assertEqual(reviewed['correct'], 2)
+
+        # The incremental counters agree with a full recomputation
+        incremental = TestStats.objects.get(test=self.test)
+        rebuild_test_stats([self.test.id])
+        rebuilt = TestStats.objects.get(test=self.test)
+        for field in ('attempts', 'completions', 'pass_count', 'score_sum', 'score_sum_squares'):
+            self.assertAlmostEqual(getattr(incremental, field), getattr(rebuilt, field))
+
+    def test_stats_query_count_does_not_grow_with_submissions(self):
+        self.submit(self.start(), correct=True)
+        _, few = self.stats()
+        for _ in range(5):
+            self.submit(self.start(), correct=False)
+        data, many = self.stats()
+
+        self.assertEqual(data['completions'], 6)
+        self.assertEqual(few, many)
+
+    def test_untaken_test_has_empty_stats(self):
+        data, _ = self.stats()
+        self.assertEqual(data['attempts'], 0)
+        self.assertIsNone(data['mean_score'])
+        self.assertEqual(data['questions'], [])
+
+
+class ItemAnalysisTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.test = make_test(2)
+        right, wrong = answers_for(self.test), answers_for(self.test, correct=False)
+        for pattern in [(1, 1), (1, 0), (0, 0), (1, 1)]:
+            submission = TestSubmission.objects.create(test=self.test, user=self.staff)
+            answers = [right[i] if outcome else wrong[i] for i, outcome in enumerate(pattern)]
+            self.client.post(f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers}, format='json')
+
+    def test_item_statistics_are_stored_and_served(self):
+        self.assertEqual(analyze_test(self.test.id), 4)
+
+        data = self.client.get(f"/api/courses/tests/{self.test.id}/stats/").data
+        self.assertEqual(data['analyzed_submissions'], 4)
+        # 2/1 * (1 - (1/4 + 1/3) / (11/12))
+        self.assertAlmostEqual(data['cronbach_alpha'], 8 / 11)
+        first, second = data['questions']
+        self.assertEqual((first['discrimination'], second['discrimination']), (1.0, 1.0))
+        self.assertAlmostEqual(first['point_biserial'], 1 / 3 ** 0.5)
+        self.assertEqual(
+            [(choice['selected'], choice['selection_rate']) for choice in first['choices']],
+            [(3, 0.75), (1, 0.25), (0, 0), (0, 0)],
+        )
+
+    def test_statistics_are_kept_when_counters_are_rebuilt(self):
+        analyze_test(self.test.id)
+        rebuild_test_stats([self.test.id])
+
+        data = self.client.get(f"/api/courses/tests/{self.test.id}/stats/").data
+        self.assertIsNotNone(data['cronbach_alpha'])
+        self.assertEqual(len(data['questions'][0]['choices']), 4)
+
+
+class TestEditorWriteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def payload(self, test):
+        data = self.client.get(f"/api/courses/tests/{test.id}/").data
+        return {
+            'lesson': data['lesson'], 'title': data['title'],
+            'questions': [dict(question) for question in data['questions']],
+        }
+
+    def save(self, test, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f"/api/courses/tests/{test.id}/", payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        small = make_test(5)
+        large = make_test(100)
+        small_payload, large_payload = self.payload(small), self.payload(large)
+        for payload in (small_payload, large_payload):
+            # Drop the second half, edit the rest and replace their choices
+            payload['questions'] = payload['questions'][:len(payload['questions']) // 2]
+            for question in payload['questions']:
+                question['text'] += " (edited)"
+                question['choices'] = [{'text': "Replaced", 'is_correct': True}]
+            payload['questions'].append({
+                'text': "New", 'question_type': QuestionType.MULTIPLE_CHOICE,
+                'choices': [{'text': "Yes", 'is_correct': True}, {'text': "No", 'is_correct': False}],
+            })
+
+        small_queries, large_queries = self.save(small, small_payload), self.save(large, large_payload)
+        # Deletes go out in batches of 100 rows: the large test's 200 choices
+        # of dropped questions and 200 replaced choices take two each
+        self.assertEqual(large_queries, small_queries + 2)
+        self.assertEqual(large.questions.filter(text__endswith="(edited)").count(), 50)
+        self.assertEqual(large.questions.count(), 51)
+        self.assertEqual(Choice.objects.filter(question__test=large, text="Replaced").count(), 50)
+        self.assertEqual(large.questions.get(text="New").choices.count(), 2)
+
+    def test_save_keeps_question_ids_and_answers(self):
+        test = make_test(3)
+        submission = TestSubmission.objects.create(test=test)
+        self.client.post(
+            f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers_for(test)}, format='json'
+        )
+        payload = self.payload(test)
+        first, second, removed = payload['questions']
+        first['choices'][0]['is_correct'] = False
+        first['choices'][1]['is_correct'] = True
+        second['choices'] = second['choices'][:2]
+        payload['questions'] = [first, second]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.save(test, payload)
+
+        self.assertEqual(list(test.questions.values_list('id', flat=True)), [first['id'], second['id']])
+        self.assertEqual(Answer.objects.filter(submission=submission).count(), 2)
+        self.assertFalse(Question.objects.filter(id=removed['id']).exists())
+        self.assertEqual(
+            list(Choice.objects.filter(question_id=first['id']).order_by('id').values_list('id', 'is_correct')),
+            [(choice['id'], choice['is_correct']) for choice in first['choices']],
+        )
+        self.assertEqual(Choice.objects.filter(question_id=second['id']).count(), 2)
+
+        # The cached answer key follows the bulk writes
+        submission = TestSubmission.objects.create(test=test)
+        response = self.client.post(
+            f"/api/courses/test-submissions/{submission.id}/submit/",
+            {'answers': [{'question_id': first['id'], 'selected_choice_ids': [first['choices'][1]['id']]}]},
+            format='json',
+        )
+        self.assertEqual(response.data['score'], 100)
+
+    def test_partial_update_without_questions_keeps_them(self):
+        test = make_test(2)
+
+        response = self.client.patch(f"/api/courses/tests/{test.id}/", {'title': "Renamed"}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test.questions.count(), 2)
+
+
+class CourseBundleTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, *args):
+        path = os.path.join(self.directory, 'bundle.jsonl.gz')
+        call_command('export_course', *args, output=path, stderr=StringIO())
+        return path
+
+    def test_round_trip_creates_a_copy(self):
+        test = make_test(3, open_every=3)
+        course = test.lesson.course
+        other = make_course(2)
+        path = self.export(str(course.id))
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_course', path, stdout=StringIO())
+
+        self.assertLessEqual(len(queries), 8)
+        copy = Course.objects.exclude(pk__in=[course.pk, other.pk]).get()
+        copied_test = Test.objects.get(lesson__course=copy)
+        self.assertEqual(
+            [(q.text, q.question_type, q.correct_answer) for q in copied_test.questions.all()],
+            [(q.text, q.question_type, q.correct_answer) for q in test.questions.all()],
+        )
+        self.assertEqual(
+            Choice.objects.filter(question__test=copied_test, is_correct=True).count(),
+            Choice.objects.filter(question__test=test, is_correct=True).count(),
+        )
+        self.assertEqual(other.lessons.count(), 2)
+
+    def test_broken_bundle_imports_nothing(self):
+        make_test(2)
+        path = self.export('--all')
+        with gzip.open(path, 'at') as bundle:
+            bundle.write('{"type": "choice", "ref": 0, "question": -1, "text": "Orphan"}\n')
+
+        with self.assertRaises(CommandError):
+            call_command('import_course', path, stdout=StringIO())
+        self.assertEqual(Course.objects.count(), 1)
+
+    def test_malformed_bundles_are_refused(self):
+        make_test(2)
+        exported = self.export('--all')
+        with gzip.open(exported, 'rb') as bundle:
+            header, *rows = bundle.read().splitlines(keepends=True)
+        bundles = {
+            'header': b'not json\n' + b''.join(rows),
+            'row': header + b'[1, 2]\n' + b''.join(rows),
+            'encoding': header + b'\xff\xfe\n',
+        }
+        for name, content in bundles.items():
+            path = os.path.join(self.directory, f'{name}.jsonl.gz')
+            with gzip.open(path, 'wb') as bundle:
+                bundle.write(content)
+            with self.subTest(name), self.assertRaises(CommandError):
+                call_command('import_course', path, stdout=StringIO())
+
+        corrupt = os.path.join(self.directory, 'corrupt.jsonl.gz')
+        with open(exported, 'rb') as source, open(corrupt, 'wb') as bundle:
+            bundle.write(source.read()[:-20])
+        with self.assertRaises(CommandError):
+            call_command('import_course', corrupt, stdout=StringIO())
+        self.assertEqual(Course.objects.count(), 1)
+
+
+class SubmissionExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.test = make_test(3, open_every=3)
+        for correct in (True, False):
+            submission = TestSubmission.objects.create(test=self.test, user=self.staff)
+            self.client.post(
+                f"/api/courses/test-submissions/{submission.id}/submit/",
+                {'answers': answers_for(self.test, correct=correct)}, format='json',
+            )
+        # Not part of the export filtered by test
+        make_test(1)
+
+    def download(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            body = b"".join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        return body, len(queries)
+
+    def test_answers_csv_lists_selected_choices(self):
+        body, _ = self.download(f"/api/courses/exports/answers.csv?test={self.test.id}")
+
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 6)
+        expected = {
+            answer.id: " ".join(str(choice.id) for choice in answer.selected_choices.order_by('id'))
+            for answer in Answer.objects.all()
+        }
+        self.assertEqual({int(row['answer_id']): row['selected_choice_ids'] for row in rows}, expected)
+        self.assertEqual({row['user'] for row in rows}, {"teacher"})
+
+    def test_query_count_does_not_grow_with_submissions(self):
+        _, few = self.download("/api/courses/exports/answers.jsonl")
+        anonymous = APIClient()
+        for _ in range(5):
+            submission = TestSubmission.objects.create(test=self.test)
+            anonymous.post(
+                f"/api/courses/test-submissions/{submission.id}/submit/",
+                {'answers': answers_for(self.test)}, format='json',
+            )
+
+        body, many = self.download("/api/courses/exports/answers.jsonl")
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(body.splitlines()), 21)
+        self.assertIsNone(json.loads(body.splitlines()[-1])['user'])
+
+    def test_submissions_command_writes_jsonl(self):
+        out = StringIO()
+        call_command('export_submissions', 'submissions', '--format', 'jsonl', '--test', str(self.test.id), stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['score'] for row in rows], [100, 0])
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get("/api/courses/exports/submissions.csv")
+
+        self.assertIn(response.status_code, (401, 403))
+
+
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.test = make_test(2)
+        self.lesson = self.test.lesson
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_hits_skip_the_database(self):
+        for url in (
+            f"/api/courses/courses/{self.lesson.course_id}/",
+            f"/api/courses/lessons/{self.lesson.id}/",
+            f"/api/courses/tests/{self.test.id}/",
+            f"/api/courses/lessons/{self.lesson.id}/test/",
+        ):
+            first, _ = self.get(url)
+            second, queries = self.get(url)
+            self.assertEqual(queries, 0)
+            self.assertEqual(second, first)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.get(f"/api/courses/lessons/{self.lesson.id}/")
+
+        data, queries = self.get(f"/api/courses/lessons/{self.lesson.id}/?fields=id,title")
+
+        self.assertGreater(queries, 0)
+        self.assertEqual(set(data), {'id', 'title'})
+
+    def test_child_edits_invalidate_cached_payloads(self):
+        course_url = f"/api/courses/courses/{self.lesson.course_id}/"
+        test_url = f"/api/courses/tests/{self.test.id}/"
+        self.get(course_url)
+        self.get(test_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(
+                course_id=self.lesson.course_id, title="Added", video_url="https://example.com/video"
+            )
+            choice = Choice.objects.filter(question__test=self.test).first()
+            choice.text = "Edited"
+            choice.save()
+
+        course, _ = self.get(course_url)
+        self.assertEqual(course['lessons'][-1]['title'], "Added")
+        test, _ = self.get(test_url)
+        self.assertIn("Edited", [c['text'] for q in test['questions'] for c in q['choices']])
+
+    def test_editor_saves_invalidate_the_test(self):
+        url = f"/api/courses/tests/{self.test.id}/"
+        payload, _ = self.get(url)
+        questions = [dict(question, text="Rewritten") for question in payload['questions']]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(url, {'lesson': self.lesson.id, 'title': "Test", 'questions': questions}, format='json')
+
+        data, _ = self.get(url)
+        self.assertEqual({question['text'] for question in data['questions']}, {"Rewritten"})
+
+    def test_deleting_a_test_records_the_change_once(self):
+        def delete(test):
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f"/api/courses/tests/{test.id}/")
+            self.assertEqual(response.status_code, 204)
+            return len(queries)
+
+        lesson_test_url = f"/api/courses/lessons/{self.lesson.id}/test/"
+        self.get(lesson_test_url)
+        small = delete(self.test)
+        # Below the 100 rows Django deletes per query
+        large = delete(make_test(20))
+
+        self.assertEqual(large, small)
+        self.assertEqual(self.client.get(lesson_test_url).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.test = make_test(2)
+        self.lesson = self.test.lesson
+        self.course = self.lesson.course
+
+    def get(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        return response, len(queries)
+
+    def test_matching_etag_gets_304_without_queries_once_cached(self):
+        url = f"/api/courses/lessons/{self.lesson.id}/"
+        response, _ = self.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+        response, queries = self.get(url, if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(queries, 0)
+
+    def test_cold_cache_304_loads_nothing(self):
+        url = f"/api/courses/courses/{self.course.id}/"
+        etag = self.get(url)[0]['ETag']
+        caches['content'].clear()
+
+        response, queries = self.get(url, if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        # Just the version check, no course or lessons
+        self.assertEqual(queries, 1)
+
+    def test_list_304_needs_only_the_version_check(self):
+        url = f"/api/courses/courses/{self.course.id}/lessons/list/"
+        user = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=user)
+        response, _ = self.get(url)
+
+        response, queries = self.get(url, if_none_match=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, 1)
+
+    def test_child_edits_change_the_etags(self):
+        urls = [
+            "/api/courses/courses/",
+            f"/api/courses/courses/{self.course.id}/",
+            f"/api/courses/tests/{self.test.id}/",
+            f"/api/courses/lessons/{self.lesson.id}/test/",
+        ]
+        etags = {url: self.get(url)[0]['ETag'] for url in urls}
+        test_updated_at = self.test.updated_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            choice = Choice.objects.filter(question__test=self.test).first()
+            choice.is_correct = not choice.is_correct
+            choice.save()
+
+        for url in urls:
+            response, _ = self.get(url, if_none_match=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etags[url])
+        self.test.refresh_from_db()
+        self.assertGreater(self.test.updated_at, test_updated_at)
+
+
+class PrecompressedContentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.lesson = make_course(1).lessons.get()
+        self.lesson.description = "<style>" + ".lesson { color: red; } " * 500 + "</style>"
+        self.lesson.save()
+        self.url = f"/api/courses/lessons/{self.lesson.id}/"
+
+    def test_negotiates_encodings(self):
+        self.assertEqual(compression.negotiate(""), compression.IDENTITY)
+        self.assertEqual(compression.negotiate("gzip, deflate"), "gzip")
+        self.assertEqual(compression.negotiate("gzip;q=0.5, identity;q=0.8"), compression.IDENTITY)
+        self.assertEqual(compression.negotiate("gzip;q=0, *;q=0"), compression.IDENTITY)
+        if 'br' in compression.COMPRESSORS:
+            self.assertEqual(compression.negotiate("gzip, deflate, br"), "br")
+
+    def test_serves_gzip_compressed_once(self):
+        with mock.patch.object(compression, 'compress_payload', wraps=compression.compress_payload) as compress:
+            plain = self.client.get(self.url)
+            first = self.client.get(self.url, headers={'accept-encoding': 'gzip'})
+            second = self.client.get(self.url, headers={'accept-encoding': 'gzip'})
+
+        self.assertEqual(compress.call_count, 1)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(second['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', second['Vary'])
+        self.assertLess(len(second.content), len(plain.content) / 10)
+        self.assertEqual(json.loads(gzip.decompress(second.content)), plain.json())
+        self.assertEqual(first.content, second.content)
+        self.assertNotEqual(second['ETag'], plain['ETag'])
+
+    def test_etag_of_one_encoding_does_not_match_another(self):
+        etag = self.client.get(self.url, headers={'accept-encoding': 'gzip'})['ETag']
+
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+
+class CourseProgressTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.test = make_test(2, open_every=2)
+        self.course = self.test.lesson.course
+        second = Lesson.objects.create(course=self.course, title="Second", video_url="https://example.com/video")
+        self.other_test = Test.objects.create(lesson=second, title="Other")
+        question = Question.objects.create(test=self.other_test, text="Question")
+        Choice.objects.create(question=question, text="Right", is_correct=True)
+
+    def take(self, test, correct):
+        submission = TestSubmission.objects.create(test=test, user=self.user)
+        self.client.post(
+            f"/api/courses/test-submissions/{submission.id}/submit/",
+            {'answers': answers_for(test, correct=correct)}, format='json',
+        )
+        return submission
+
+    def progress(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/courses/courses/{self.course.id}/progress/")
+        self.assertEqual(response.status_code, 200)
+        # Authentication is forced, so this is the progress query alone
+        self.assertEqual(len(queries), 1)
+        return response.data
+
+    def test_progress_follows_completed_submissions(self):
+        self.assertEqual(self.progress()['lessons_passed'], 0)
+
+        self.take(self.test, correct=False)
+        data = self.progress()
+        self.assertEqual(data['lessons_passed'], 0)
+        self.assertEqual(data['lessons'][0]['attempts'], 1)
+        self.assertFalse(data['lessons'][0]['passed'])
+
+        self.take(self.test, correct=True)
+        self.take(self.test, correct=False)
+        self.take(self.other_test, correct=True)
+        data = self.progress()
+        self.assertEqual(data['lessons_passed'], 2)
+        first = data['lessons'][0]
+        self.assertEqual((first['attempts'], first['best_score'], first['passed']), (3, 100, True))
+
+    def test_reviews_can_take_a_pass_back(self):
+        submission = self.take(self.test, correct=True)
+        self.assertEqual(self.progress()['lessons_passed'], 1)
+        staff = get_user_model().objects.create_user(
+            username="teacher", email="teacher@example.com", password="pass", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+        open_answer = Answer.objects.get(submission=submission, question__question_type=QuestionType.OPEN_ENDED)
+
+        self.client.patch(f"/api/courses/answers/{open_answer.id}/review/", {'is_correct': False}, format='json')
+
+        self.client.force_authenticate(user=self.user)
+        data = self.progress()
+        self.assertEqual(data['lessons_passed'], 0)
+        self.assertEqual(data['lessons'][0]['best_score'], 50)
+
+    def test_rebuild_command_restores_progress(self):
+        self.take(self.test, correct=True)
+        self.take(self.other_test, correct=True)
+        CourseProgress.objects.update(lessons_passed=0)
+        LessonProgress.objects.update(attempts=0, passed=False)
+
+        call_command('rebuild_submission_scores', stdout=StringIO())
+
+        data = self.progress()
+        self.assertEqual(data['lessons_passed'], 2)
+        self.assertEqual([lesson['attempts'] for lesson in data['lessons']], [1, 1])
+
+
+class CourseCompletionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="student", email="student@example.com", password="pass", full_name="Aru Student"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.test = make_test(1)
+        self.course = self.test.lesson.course
+        self.url = f"/api/courses/courses/{self.course.id}/complete/"
+
+    def pass_test(self):
+        submission = TestSubmission.objects.create(test=self.test, user=self.user)
+        self.client.post(
+            f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers_for(self.test)}, format='json'
+        )
+
+    def test_requires_passed_tests(self):
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['lessons_passed'], response.data['lessons_required']), (0, 1))
+        self.assertFalse(Certificate.objects.exists())
+
+    def test_deleted_lessons_and_tests_do_not_count(self):
+        self.pass_test()
+        lesson = Lesson.objects.create(course=self.course, title="Other", video_url="https://example.com/video")
+        Test.objects.create(lesson=lesson, title="Other test")
+
+        # The passed test goes, its lesson stays
+        self.test.delete()
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['lessons_passed'], response.data['lessons_required']), (0, 1))
+
+        self.test.lesson.delete()
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertFalse(Certificate.objects.exists())
+
+    def test_courses_without_tests_cannot_be_completed(self):
+        course = make_course(2, with_tests=False)
+
+        response = self.client.post(f"/api/courses/courses/{course.id}/complete/")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Certificate.objects.exists())
+
+    def test_issues_one_certificate(self):
+        self.pass_test()
+
+        first = self.client.post(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.post(self.url)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['code'], first.data['code'])
+        self.assertEqual(first.data['student_name'], "Aru Student")
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual(Certificate.objects.count(), 1)
+        progress = self.client.get(f"/api/courses/courses/{self.course.id}/progress/").data
+        self.assertTrue(progress['is_completed'])
+
+    def test_certificates_are_verified_publicly_by_code(self):
+        self.pass_test()
+        code = self.client.post(self.url).data['code']
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(f"/api/courses/certificates/{code}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['course_name'], self.course.name)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get("/api/courses/certificates/NOPE/").status_code, 404)
+
+
+class AttemptHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.test = make_test(2)
+        self.other_test = make_test(1)
+
+    def take(self, test, answers):
+        submission = TestSubmission.objects.create(test=test, user=self.user)
+        self.client.post(f"/api/courses/test-submissions/{submission.id}/submit/", {'answers': answers}, format='json')
+        return submission
+
+    def test_history_marks_best_and_latest_in_one_query(self):
+        right, wrong = answers_for(self.test), answers_for(self.test, correct=False)
+        first = self.take(self.test, [right[0], wrong[1]])
+        best = self.take(self.test, right)
+        latest = self.take(self.test, wrong)
+        unfinished = TestSubmission.objects.create(test=self.other_test, user=self.user)
+        # Another user's attempts stay out
+        TestSubmission.objects.create(test=self.test)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/courses/attempts/")
+
+        self.assertEqual(len(queries), 1)
+        history, other = response.data
+        self.assertEqual((history['test'], history['best_score']), (self.test.id, 100))
+        self.assertEqual(history['best_attempt'], best.id)
+        self.assertEqual([attempt['id'] for attempt in history['attempts']], [latest.id, best.id, first.id])
+        self.assertEqual([attempt['is_best'] for attempt in history['attempts']], [False, True, False])
+        self.assertEqual([attempt['is_latest'] for attempt in history['attempts']], [True, False, False])
+        self.assertIsNone(other['best_attempt'])
+        self.assertEqual(other['latest_attempt'], unfinished.id)
+
+    def test_filters_by_test(self):
+        self.take(self.test, answers_for(self.test))
+        self.take(self.other_test, answers_for(self.other_test))
+
+        response = self.client.get(f"/api/courses/attempts/?test={self.other_test.id}")
+
+        self.assertEqual([history['test'] for history in response.data], [self.other_test.id])
+
+
+class AttemptLimitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.test = make_test(1)
+
+    def start(self):
+        return self.client.post(f"/api/courses/tests/{self.test.id}/start/", {'test': self.test.id}, format='json')
+
+    def test_max_attempts(self):
+        Test.objects.filter(pk=self.test.pk).update(max_attempts=2)
+
+        self.assertEqual([self.start().status_code for _ in range(3)], [201, 201, 403])
+        self.assertEqual(TestSubmission.objects.filter(test=self.test).count(), 2)
+        self.assertEqual(AttemptCounter.objects.get(user=self.user, test=self.test).started, 2)
+
+    def test_cooldown(self):
+        Test.objects.filter(pk=self.test.pk).update(attempt_cooldown=10)
+        self.assertEqual(self.start().status_code, 201)
+
+        response = self.start()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(570 <= int(response['Retry-After']) <= 600)
+
+        AttemptCounter.objects.update(last_started_at=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(self.start().status_code, 201)
+
+    def test_unlimited_tests_still_count_attempts(self):
+        self.start()
+        self.start()
+        self.assertEqual(AttemptCounter.objects.get(user=self.user, test=self.test).started, 2)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.start().status_code, 201)
+        Test.objects.filter(pk=self.test.pk).update(max_attempts=5)
+        self.assertEqual(self.start().status_code, 403)
+
+    def test_reaper_closes_expired_submissions(self):
+        expired = TestSubmission.objects.create(test=self.test, user=self.user)
+        running = TestSubmission.objects.create(test=self.test, user=self.user)
+        graded = TestSubmission.objects.create(test=self.test, user=self.user)
+        self.client.post(
+            f"/api/courses/test-submissions/{graded.id}/submit/", {'answers': answers_for(self.test)}, format='json',
+        )
+        long_ago = timezone.now() - timedelta(minutes=self.test.time_limit + 5)
+        TestSubmission.objects.filter(pk__in=[expired.pk, graded.pk]).update(start_time=long_ago)
+
+        self.assertEqual(reap_abandoned(), 1)
+
+        expired.refresh_from_db()
+        self.assertTrue(expired.is_completed)
+        self.assertEqual(expired.score, 0)
+        self.assertEqual(expired.end_time, long_ago + timedelta(minutes=self.test.time_limit))
+        self.assertFalse(TestSubmission.objects.get(pk=running.pk).is_completed)
+        self.assertEqual(TestSubmission.objects.get(pk=graded.pk).score, 100)
+        self.assertEqual(TestStats.objects.get(test=self.test).completions, 2)
+        self.assertEqual(LessonProgress.objects.get(user=self.user).attempts, 2)
+
+    def test_reaper_grades_partial_answers(self):
+        test = make_test(4)
+        partial = TestSubmission.objects.create(test=test, user=self.user)
+        questions = list(test.questions.all())
+        Answer.objects.bulk_create([
+            Answer(submission=partial, question=questions[0], is_correct=True),
+            Answer(submission=partial, question=questions[1], is_correct=False),
+        ])
+        TestSubmission.objects.filter(pk=partial.pk).update(start_time=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(reap_abandoned(batch_size=1), 1)
+
+        partial.refresh_from_db()
+        self.assertEqual((partial.earned_points, partial.total_points, partial.score), (1, 2, 50))
+        self.assertEqual(TestStats.objects.get(test=test).score_sum, 50)
+
+    def test_sweep_scans_open_submissions_by_start_time(self):
+        plan = TestSubmission.objects.filter(
+            is_completed=False, start_time__lt=timezone.now(), test__time_limit=30,
+        ).values_list('pk').explain()
+        self.assertIn('submission_open_start_idx', plan)
+
+    def test_submitting_after_the_time_limit(self):
+        late, on_time = self.start().data['id'], self.start().data['id']
+        TestSubmission.objects.filter(pk=late).update(start_time=timezone.now() - timedelta(minutes=self.test.time_limit + 2))
+        TestSubmission.objects.filter(pk=on_time).update(start_time=timezone.now() - timedelta(minutes=self.test.time_limit))
+
+        response = self.client.post(
+            f"/api/courses/test-submissions/{late}/submit/", {'answers': answers_for(self.test)}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['score'], response.data['completed']), (0, True))
+        self.assertFalse(Answer.objects.filter(submission_id=late).exists())
+        self.assertEqual(LessonProgress.objects.get(user=self.user).attempts, 1)
+
+        # Within the grace period
+        response = self.client.post(
+            f"/api/courses/test-submissions/{on_time}/submit/", {'answers': answers_for(self.test)}, format='json',
+        )
+        self.assertEqual(response.data['score'], 100)
+        self.assertEqual(reap_abandoned(), 0)
@@ -5,7 +5,9 @@ from .views import (
     CourseViewSet, LessonViewSet, CourseListCreateView, CourseDetailView,
     LessonCreateView, LessonsByCourseView, TestViewSet, TestDetailView,
     TestByLessonView, CreateTestForLessonView, QuestionViewSet, StartTestView,
-    SubmitTestView, TestSubmissionResultView, ReviewOpenAnswerView
+    SubmitTestView, TestSubmissionResultView, ReviewOpenAnswerView,
+    BulkReviewOpenAnswersView, PendingAnswersView, TestStatsView, SubmissionExportView,
+    CourseProgressView, CompleteCourseView, CertificateVerificationView, AttemptHistoryView
 )
 
 router = DefaultRouter()
@@ -21,6 +23,9 @@ urlpatterns = [
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
     path('courses/<int:course_id>/lessons/', LessonCreateView.as_view(), name='lesson-create'),
     path('courses/<int:course_id>/lessons/list/', LessonsByCourseView.as_view(), name='lessons-by-course'),
+    path('courses/<int:course_id>/progress/', CourseProgressView.as_view(), name='course-progress'),
+    path('courses/<int:course_id>/complete/', CompleteCourseView.as_view(), name='complete-course'),
+    path('certificates/<str:code>/', CertificateVerificationView.as_view(), name='verify-certificate'),
     
     # Test related URLs
     path('tests/<int:pk>/', TestDetailView.as_view(), name='test-detail'),
@@ -29,9 +34,16 @@ urlpatterns = [
     
     # Test submission URLs
     path('tests/<int:test_id>/start/', StartTestView.as_view(), name='start-test'),
+    path('tests/<int:test_id>/stats/', TestStatsView.as_view(), name='test-stats'),
     path('test-submissions/<int:submission_id>/submit/', SubmitTestView.as_view(), name='submit-test'),
     path('test-submissions/<int:pk>/result/', TestSubmissionResultView.as_view(), name='test-submission-result'),
+    path('attempts/', AttemptHistoryView.as_view(), name='attempt-history'),
     
     # Review open-ended answers
     path('answers/<int:pk>/review/', ReviewOpenAnswerView.as_view(), name='review-open-answer'),
+    path('answers/pending/', PendingAnswersView.as_view(), name='pending-answers'),
+    path('answers/review/bulk/', BulkReviewOpenAnswersView.as_view(), name='bulk-review-open-answers'),
+    
+    # Reporting exports
+    path('exports/<str:dataset>.<str:output_format>', SubmissionExportView.as_view(), name='submission-export'),
 ]
\ No newline at end of file
@@ -138,6 +138,33 @@ elif os.getenv('DB_NAME'):
     }
 
 
+# Caches. Serialized course content and the answer keys used for grading go
+# to the 'content' cache, which is local memory unless CONTENT_CACHE_URL names
+# a directory (file://...) or a Redis server (redis://...) shared by all
+# processes. Run several processes only with a shared cache, or they keep
+# grading with answer keys edited elsewhere.
+CONTENT_CACHE_URL = os.getenv('CONTENT_CACHE_URL', '')
+
+if CONTENT_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CONTENT_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CONTENT_CACHE_URL}
+elif CONTENT_CACHE_URL.startswith('file://'):
+    CONTENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CONTENT_CACHE_URL[len('file://'):],
+    }
+else:
+    CONTENT_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'content'}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'content': CONTENT_CACHE,
+}
+
+
+# Scoring backend for open-ended answers (see courses.scoring)
+OPEN_ANSWER_SCORER = os.getenv('OPEN_ANSWER_SCORER', 'courses.scoring.KeyTermScorer')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 